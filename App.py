@@ -1,17 +1,24 @@
 import sys
+import asyncio
 import threading
-import queue
 import json
 import os
 
 from PyQt6.QtSvgWidgets import QSvgWidget
 from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QLabel, QFrame, QColorDialog, QPushButton, QComboBox, QSpinBox
-from PyQt6.QtCore import Qt, QPropertyAnimation, QEasingCurve, QPoint, QTimer, QByteArray
+from PyQt6.QtCore import Qt, QPropertyAnimation, QEasingCurve, QPoint, QTimer, QByteArray, QObject, pyqtSignal
 from PyQt6.QtGui import QFont, QColor, QPainter, QIcon
 
 from LyricDisplayer import DisplayWindow
 from TokenManager import TokenManager
 from LyricFetcher import LyricFetcher
+from LyricScheduler import LyricScheduler
+
+# Optional, lets everything share one asyncio loop with Qt
+try:
+    import qasync
+except ImportError:
+    qasync = None
 
 
 class ThemeButton(QPushButton):
@@ -71,8 +78,42 @@ class ThemeButton(QPushButton):
 
         painter.end()
 
-class MainWindow(QMainWindow):
+# Carries playback anchors from the fetcher thread to the GUI thread, only the latest anchor is delivered
+class LyricBridge(QObject):
+    anchor_posted = pyqtSignal()
+    anchor_changed = pyqtSignal(object)
+
     def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.latest_anchor = None
+        self.delivered_version = 0
+        self.pending = False
+
+        self.anchor_posted.connect(self.Deliver, Qt.ConnectionType.QueuedConnection)
+
+    def Post(self, anchor):
+        # Any thread. Newer anchors replace ones the GUI has not picked up yet
+        with self.lock:
+            self.latest_anchor = anchor
+            if self.pending:
+                return
+            self.pending = True
+        self.anchor_posted.emit()
+
+    def Deliver(self):
+        with self.lock:
+            anchor = self.latest_anchor
+            self.pending = False
+
+        if anchor is None or anchor.version <= self.delivered_version:
+            return
+        self.delivered_version = anchor.version
+        self.anchor_changed.emit(anchor)
+
+
+class MainWindow(QMainWindow):
+    def __init__(self, event_loop=None):
         super().__init__()
         self.setWindowTitle("Show My Lyrics")
         self.setFixedSize(600, 800)
@@ -83,6 +124,8 @@ class MainWindow(QMainWindow):
         app.setWindowIcon(QIcon(icon_path))
 
         self.settings_file = "settings.json"
+        self.event_loop = event_loop
+        self.runtime_tasks = []
 
         # Lyrics Data
         self.chosen_font = "Arial"
@@ -95,6 +138,9 @@ class MainWindow(QMainWindow):
         self.chosen_position = (2, 1)
         self.chosen_alignment = 2
         self.chosen_theme_ind = 0
+        self.chosen_renderer = "labels"
+        self.chosen_lines = 3
+        self.chosen_motion = "jump"
 
         # Customization Menu Data
         self.theme_labels = ["red", "orange", "green", "turquoise", "blue", "purple"]
@@ -107,7 +153,7 @@ class MainWindow(QMainWindow):
         self.setStyleSheet(f"background-color: {self.menu_bg_color_bottom};")
 
         # Set the token manager
-        self.token_manager = TokenManager(client_id="7314df2b002f4442a5f07737b77cfab3", on_token_refresh=self.RefreshSpotifyClient)
+        self.token_manager = TokenManager(client_id="7314df2b002f4442a5f07737b77cfab3", on_token_refresh=self.RefreshSpotifyClient, auto_refresh=event_loop is None)
 
         # Create central widget
         central_widget = QWidget()
@@ -134,20 +180,27 @@ class MainWindow(QMainWindow):
 
         # Instantiate necessary things
         self.display_window = DisplayWindow()
-        self.lyrics_queue = queue.Queue()
+        self.lyric_scheduler = LyricScheduler(self)
+        self.lyric_scheduler.lyrics_changed.connect(self.display_window.UpdateLyrics)
+        self.lyric_scheduler.timeline_changed.connect(self.display_window.SetTimeline)
+        self.display_window.SetWordSource(self.lyric_scheduler)
+        self.lyric_bridge = LyricBridge()
+        self.lyric_bridge.anchor_changed.connect(self.lyric_scheduler.Apply)
 
         # Start LyricFetcher
-        self.lyric_fetcher = LyricFetcher(self.OnLyricsChange)
-        self.fetcher_thread = threading.Thread(target=self.lyric_fetcher.Run, daemon=True)
-        self.fetcher_thread.start()
+        self.lyric_fetcher = LyricFetcher(self.OnPlaybackAnchor)
+        if self.event_loop:
+            self.runtime_tasks.append(self.event_loop.create_task(self.lyric_fetcher.RunAsync()))
+            self.runtime_tasks.append(self.event_loop.create_task(self.token_manager.auto_refresh_async()))
+        else:
+            self.fetcher_thread = threading.Thread(target=self.lyric_fetcher.Run, daemon=True)
+            self.fetcher_thread.start()
 
         # Load last settings
         self.LoadSettings()
         self.UpdateDisplaySettings()
         self.ChangeMenuTheme(self.theme_labels[self.chosen_theme_ind])
 
-        # Start processing the queue
-        self.ProcessLyricsQueue()
         self.CheckLoginRemoval()
 
 
@@ -219,29 +272,24 @@ class MainWindow(QMainWindow):
                 alignment=self.chosen_alignment,
                 bold=self.chosen_bold,
                 italic=self.chosen_italic,
-                underline=self.chosen_underline
+                underline=self.chosen_underline,
+                renderer=self.chosen_renderer,
+                lines=self.chosen_lines,
+                motion=self.chosen_motion
             )
+            self.lyric_scheduler.SetWindow(self.display_window.window_before, self.display_window.window_after)
 
-    # Function to get lyrics from our queue
-    def ProcessLyricsQueue(self):
-        try:
-            while not self.lyrics_queue.empty():
-                lyrics_data = self.lyrics_queue.get_nowait()
-                self.display_window.UpdateLyrics(lyrics_data)
-
-        except queue.Empty:
-            pass
-
-        QTimer.singleShot(250, self.ProcessLyricsQueue)
-
-    # Function to put lyrics into the queue
-    def OnLyricsChange(self, lyrics_data):
-        self.lyrics_queue.put(lyrics_data)
+    # Function to pass the playback state to the lyric scheduler, safe to call from any thread
+    def OnPlaybackAnchor(self, anchor):
+        self.lyric_bridge.Post(anchor)
 
     # Function that works when we close the main window
     def closeEvent(self, event):
         if hasattr(self, 'lyric_fetcher'):
             self.lyric_fetcher.Stop()
+            self.lyric_scheduler.Stop()
+        for task in self.runtime_tasks:
+            task.cancel()
         if hasattr(self, 'display_window'):
             self.display_window.close()
         event.accept()
@@ -263,8 +311,13 @@ class MainWindow(QMainWindow):
 
     # Function to refresh spotify client after changing tokens
     def RefreshSpotifyClient(self):
+        # Keep the existing client (and its connections), just swap in the new token
+        if self.lyric_fetcher.sp:
+            self.lyric_fetcher.sp.set_auth(self.token_manager.get_token())
+            return
+
         sp = self.token_manager.create_spotify_client()
-        self.lyric_fetcher.sp = sp
+        self.lyric_fetcher.SetClient(sp)
 
     # Function to save customization settings
     def SaveSettings(self):
@@ -278,7 +331,10 @@ class MainWindow(QMainWindow):
             "chosen_opacity": self.chosen_opacity,
             "chosen_position": self.chosen_position,
             "chosen_alignment": self.chosen_alignment,
-            "chosen_theme_ind": self.chosen_theme_ind
+            "chosen_theme_ind": self.chosen_theme_ind,
+            "chosen_renderer": self.chosen_renderer,
+            "chosen_lines": self.chosen_lines,
+            "chosen_motion": self.chosen_motion
         }
 
         with open(self.settings_file, "w") as f:
@@ -301,6 +357,9 @@ class MainWindow(QMainWindow):
                     self.chosen_position = tuple(data.get("chosen_position", (1, 1)))
                     self.chosen_alignment = data.get("chosen_alignment", 2)
                     self.chosen_theme_ind = data.get("chosen_theme_ind", 0)
+                    self.chosen_renderer = data.get("chosen_renderer", "labels")
+                    self.chosen_lines = data.get("chosen_lines", 3)
+                    self.chosen_motion = data.get("chosen_motion", "jump")
 
             except Exception as e:
                 print(f"[MainWindow] Failed to load settings: {e}")
@@ -1237,6 +1296,21 @@ class LoginSection(QFrame):
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    window = MainWindow()
-    window.show()
-    sys.exit(app.exec())
\ No newline at end of file
+
+    # Run fetching, token refresh and Qt on a single asyncio loop
+    if "--async-runtime" in sys.argv and qasync:
+        event_loop = qasync.QEventLoop(app)
+        asyncio.set_event_loop(event_loop)
+
+        window = MainWindow(event_loop)
+        window.show()
+        with event_loop:
+            event_loop.run_forever()
+
+    else:
+        if "--async-runtime" in sys.argv:
+            print("[MainWindow] qasync is not installed, using the threaded runtime")
+
+        window = MainWindow()
+        window.show()
+        sys.exit(app.exec())
\ No newline at end of file
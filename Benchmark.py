@@ -0,0 +1,236 @@
+import os
+import sys
+import random
+import time
+import timeit
+
+from LrcParser import ParseLrc
+from LyricScheduler import LyricScheduler
+
+# Unix only, peak memory is left out without it
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+
+def MakeLrc(line_count, spacing=2.5, filler=0):
+    # filler pads every few lines with extra words, enough of them wrap
+    lines = []
+    for i in range(line_count):
+        total = i * spacing
+        lines.append(f"[{int(total // 60):02d}:{total % 60:05.2f}] Line number {i}" + " la" * (i % 4 * filler))
+    return "\n".join(lines)
+
+
+def LinearFindLocation(scheduler, progress):
+    # The old forward/backward walk, kept as a baseline. Prepares the lines on a change like
+    # FindLocation does, so both columns time the whole lookup
+    old_ind = scheduler.ind
+    track_length = len(scheduler.timestamps)
+
+    while scheduler.ind < track_length - 1 and progress > scheduler.timestamps[scheduler.ind+1]-0.1:
+        scheduler.ind += 1
+
+    while scheduler.ind > 0 and progress < scheduler.timestamps[scheduler.ind-1]-0.1:
+        scheduler.ind -= 1
+
+    if old_ind != scheduler.ind:
+        scheduler.PrepareLyrics(scheduler.ind)
+        return True
+    return False
+
+
+def BenchmarkTimeline(repeat=5):
+    print("Timeline lookup (random seeks, microseconds per lookup including the visible lines)")
+    print(f"{'lines':>8} {'linear':>10} {'bisect':>10}")
+
+    for line_count in (60, 1000, 10000):
+        scheduler = LyricScheduler()
+        scheduler.LoadTimeline(ParseLrc(MakeLrc(line_count)))
+
+        rng = random.Random(line_count)
+        seeks = [rng.uniform(0, scheduler.timestamps[-1]) for _ in range(2000)]
+
+        def run_linear():
+            for progress in seeks:
+                LinearFindLocation(scheduler, progress)
+
+        def run_bisect():
+            for progress in seeks:
+                scheduler.FindLocation(progress)
+
+        scheduler.ind = 0
+        linear = min(timeit.repeat(run_linear, number=1, repeat=repeat)) / len(seeks) * 1e6
+        scheduler.ind = 0
+        binary = min(timeit.repeat(run_bisect, number=1, repeat=repeat)) / len(seeks) * 1e6
+
+        print(f"{line_count:>8} {linear:>10.2f} {binary:>10.2f}")
+
+
+def BenchmarkParser(repeat=5):
+    print("Lrc parsing (files per second)")
+    print(f"{'lines':>8} {'files/s':>12}")
+
+    for line_count in (60, 200, 1000):
+        text = "[ar:Artist]\n[ti:Title]\n[offset:+250]\n" + MakeLrc(line_count)
+        number = max(20000 // line_count, 10)
+
+        seconds = min(timeit.repeat(lambda: ParseLrc(text), number=number, repeat=repeat)) / number
+        print(f"{line_count:>8} {1 / seconds:>12.0f}")
+
+
+def BenchmarkLabels(frames=600):
+    # Drives the label animation properties by hand, like the property animations do
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    from LyricDisplayer import DisplayWindow
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = DisplayWindow()
+    window.show()
+
+    print("Label animation ticks (4 labels, size and position)")
+    print(f"{'size':>8} {'ms/frame':>10}")
+
+    for size in (20, 40, 80):
+        window.UpdateCustomization(size=size, opacity=80)
+        start = time.perf_counter()
+
+        for tick in range(frames):
+            progress = (tick % 60) / 60
+            for i, label in enumerate(window.lyrics_arr):
+                label.font_size = window.start_size[i] + (window.target_size[i] - window.start_size[i]) * progress
+                label.y_position = window.start_pos[i] + (window.target_pos[i] - window.start_pos[i]) * progress
+            app.processEvents()
+
+        print(f"{size:>8} {(time.perf_counter() - start) / frames * 1e3:>10.3f}")
+
+    window.close()
+
+
+class VirtualClock:
+    # Stands in for the scheduler's PlaybackClock, BenchmarkTransitions moves it one frame at a time
+    def __init__(self):
+        self.position = 0.0
+        self.playing = True
+
+    def Position(self):
+        return self.position
+
+
+def PeakMemory():
+    # Peak resident set size in MB, ru_maxrss is in bytes on macOS and in KB elsewhere
+    if resource is None:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+
+
+def BenchmarkTransitions(seconds=8, fps=60):
+    # Plays a synthetic timeline through the scheduler and display on virtual time, one frame at a
+    # time: the transition advances to the frame's time, then the whole window repaints synchronously
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    from LyricDisplayer import DisplayWindow
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    budget = 1 / fps
+
+    print(f"Display transitions ({seconds} s of playback at {fps} fps, dropped frames took over {budget * 1e3:.1f} ms)")
+    print(f"{'renderer':>8} {'motion':>7} {'lines/s':>8} {'size':>5} {'align':>6} {'style ms':>9} {'paint ms':>9} {'p95 ms':>7} {'trans/s':>8} {'dropped':>8} {'peak MB':>8}")
+
+    # Line rate, font size and alignment, each varied on its own around 2 lines/s, size 40, right aligned
+    configs = [(rate, 40, 2) for rate in (0.5, 2, 4)] + [(2, size, 2) for size in (20, 80)] + [(2, 40, alignment) for alignment in (0, 1)]
+
+    for renderer in ("labels", "painter"):
+        for motion in ("jump", "scroll"):
+            window = DisplayWindow(renderer=renderer, motion=motion)
+            window.show()
+
+            scheduler = LyricScheduler()
+            scheduler.clock = VirtualClock()
+            scheduler.lyrics_changed.connect(window.UpdateLyrics)
+            scheduler.timeline_changed.connect(window.SetTimeline)
+            window.SetWordSource(scheduler)
+            scheduler.SetWindow(window.window_before, window.window_after)
+
+            for rate, size, alignment in configs:
+                start = time.perf_counter()
+                window.UpdateCustomization(size=size, opacity=80, alignment=alignment, renderer=renderer, motion=motion)
+                style_time = time.perf_counter() - start
+
+                # Measure the wrapped heights up front, like a track that has been playing for a while
+                scheduler.clock.position = 0.0
+                scheduler.LoadTimeline(ParseLrc(MakeLrc(int(seconds * rate) + 2, 1 / rate, filler=3)))
+                deadline = time.perf_counter() + 5
+                while not window.line_heights and time.perf_counter() < deadline:
+                    app.processEvents()
+
+                paint_times = []
+                transition_times = []
+                dropped = 0
+                transition_start = 0.0
+
+                for frame in range(int(seconds * fps)):
+                    position = frame / fps
+                    scheduler.clock.position = position
+                    start = time.perf_counter()
+
+                    if scheduler.FindLocation(position):
+                        scheduler.EmitFrame()
+                        transition_times.append(time.perf_counter() - start)
+                        transition_start = position
+
+                        # Run the transition on virtual time instead of the real timers
+                        if window.animation_group:
+                            window.animation_group.pause()
+                        window.scroll_timer.stop()
+
+                    if window.animation_group:
+                        window.animation_group.setCurrentTime(int((position - transition_start) * 1000))
+                    elif window.is_animating:
+                        window.ScrollFrame()
+
+                    paint_start = time.perf_counter()
+                    window.repaint()
+                    end = time.perf_counter()
+
+                    paint_times.append(end - paint_start)
+                    if end - start > budget:
+                        dropped += 1
+
+                    # Layout and pre-render results from the worker
+                    app.processEvents()
+
+                paint_times.sort()
+                paint = sum(paint_times) / len(paint_times) * 1e3
+                p95 = paint_times[int(len(paint_times) * 0.95)] * 1e3
+                transitions = len(transition_times) / sum(transition_times) if transition_times else 0
+                print(
+                    f"{renderer:>8} {motion:>7} {rate:>8} {size:>5} {alignment:>6} {style_time * 1e3:>9.2f} {paint:>9.3f} "
+                    f"{p95:>7.3f} {transitions:>8.0f} {dropped:>8} {PeakMemory():>8.1f}"
+                )
+
+            window.close()
+            window.deleteLater()
+            app.processEvents()
+
+
+BENCHMARKS = {
+    "timeline": BenchmarkTimeline,
+    "parser": BenchmarkParser,
+    "labels": BenchmarkLabels,
+    "transitions": BenchmarkTransitions,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark {name}, choose from: {', '.join(BENCHMARKS)}")
+            continue
+        BENCHMARKS[name]()
+        print()
@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+
+class TimeoutSession(requests.Session):
+    def __init__(self, timeout=(3.05, 10), pool_size=8, retries=0):
+        super().__init__()
+
+        # (connect, read) timeout used when a caller does not pass one
+        self.timeout = timeout
+
+        # Keep-alive connection pool, so repeated calls skip the TCP/TLS handshake. retries is
+        # passed on to the adapter, a count or a urllib3 Retry
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retries)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().request(method, url, **kwargs)
+
+
+# requests.Session is not documented as thread-safe, so every thread gets its own TimeoutSession
+# with its own connection pool. Still a Session itself, for clients that check, and the headers
+# set on it are shared with the thread sessions
+class ThreadLocalSession(requests.Session):
+    def __init__(self, **kwargs):
+        super().__init__()
+
+        self.session_kwargs = kwargs
+        self.local = threading.local()
+        self.sessions = []
+        self.lock = threading.Lock()
+
+    def Current(self):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = TimeoutSession(**self.session_kwargs)
+            session.headers = self.headers
+            self.local.session = session
+            with self.lock:
+                self.sessions.append(session)
+        return session
+
+    def request(self, method, url, **kwargs):
+        return self.Current().request(method, url, **kwargs)
+
+    def close(self):
+        with self.lock:
+            sessions = self.sessions
+            self.sessions = []
+        for session in sessions:
+            session.close()
+        super().close()
+
+
+class HedgedCaller:
+    def __init__(self, max_workers=4, default_delay=1.0, min_delay=0.2, sample_count=50):
+
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="HedgedRequest")
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.latencies = deque(maxlen=sample_count)
+        self.lock = threading.Lock()
+
+    def HedgeDelay(self):
+        # Observed p95 latency, a slower request than that gets a backup
+        with self.lock:
+            if len(self.latencies) < 10:
+                return self.default_delay
+            ordered = sorted(self.latencies)
+
+        return max(ordered[int(len(ordered) * 0.95) - 1], self.min_delay)
+
+    def Timed(self, function, args, kwargs):
+        start = time.monotonic()
+        result = function(*args, **kwargs)
+        with self.lock:
+            self.latencies.append(time.monotonic() - start)
+        return result
+
+    def Call(self, function, *args, **kwargs):
+        first = self.pool.submit(self.Timed, function, args, kwargs)
+        done, _ = wait([first], timeout=self.HedgeDelay())
+        if done:
+            return first.result()
+
+        # The first request is slow, race a second one against it
+        second = self.pool.submit(self.Timed, function, args, kwargs)
+        pending = {first, second}
+
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            finished = [future for future in done if future.exception() is None]
+            if finished or not pending:
+                for other in pending:
+                    other.cancel()
+                return (finished or list(done))[0].result()
+
+    def Shutdown(self):
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,176 @@
+import re
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from types import MappingProxyType
+
+
+
+# Parsed lyrics, sorted by time. timestamps is an array('d') of seconds and line_ids an array('i') of the
+# same length, line i reads texts[line_ids[i]]. Every distinct text is stored once, so repeated lines
+# (choruses) share an id and anything cached per id is reused on every repeat
+# Enhanced lrc word timings are stored flat: the words of line i are word_starts[i]:word_starts[i+1],
+# each word starts at word_times[w] and ends at character word_ends[w] of its line
+Timeline = namedtuple("Timeline", ["timestamps", "line_ids", "texts", "metadata", "word_starts", "word_times", "word_ends"])
+
+EMPTY_TIMELINE = Timeline(array('d'), array('i'), (), MappingProxyType({}), array('i', [0]), array('d'), array('i'))
+
+# A line is one or more leading [...] tags followed by the lyric text
+LINE_PATTERN = re.compile(r"^[ \t]*((?:\[[^\]\r\n]*\][ \t]*)+)([^\r\n]*)", re.MULTILINE)
+
+# [hh:mm:ss.xx], [mm:ss], [mm:ss.xx], [mm:ss:xx] or a [key:value] metadata tag. Hours need the "." fraction,
+# three fields without one are the older [mm:ss:xx]
+TAG_PATTERN = re.compile(r"\[(?:(\d+):(\d+):(\d+)\.(\d+)|(\d+):(\d+)(?:[.:](\d+))?|([A-Za-z#]+):([^\]]*))\]")
+
+# Enhanced lrc word tags, <mm:ss.xx>
+WORD_PATTERN = re.compile(r"<(\d+):(\d+)(?:[.:](\d+))?>")
+
+
+def ParseWords(raw_lyric):
+    # Split an enhanced lrc line into its clean text and (time, end character) pairs. Whitespace next to
+    # the tags collapses to a single space, so the word ends count characters of the final text
+    text = ""
+    words = []
+    word_time = None
+    spaced = False
+
+    for part_ind, part in enumerate(WORD_PATTERN.split(raw_lyric)):
+        field = part_ind % 4
+        if field == 0:
+            word = part.strip()
+            if not word:
+                spaced = spaced or part != ""
+                continue
+            if text and (spaced or part[0].isspace()):
+                text += " "
+            text += word
+            spaced = part[-1].isspace()
+            if word_time is not None:
+                words.append((word_time, len(text)))
+        elif field == 1:
+            word_time = int(part) * 60
+        elif field == 2:
+            word_time += int(part)
+        elif part:
+            word_time += int(part) / 10 ** len(part)
+
+    return text, words
+
+
+def ParseLrc(text, empty_line="(...)"):
+    if not text:
+        return EMPTY_TIMELINE
+
+    entries = []
+    metadata = {}
+
+    for line in LINE_PATTERN.finditer(text):
+        times = []
+        for tag in TAG_PATTERN.finditer(line.group(1)):
+            hours, long_minutes, long_seconds, long_fraction, minutes, seconds, fraction, key, value = tag.groups()
+
+            if key is not None:
+                metadata[key.lower()] = value.strip()
+                continue
+
+            if hours is not None:
+                minutes, seconds, fraction = long_minutes, long_seconds, long_fraction
+
+            total_time = int(minutes) * 60 + int(seconds)
+            if hours:
+                total_time += int(hours) * 3600
+            if fraction:
+                total_time += int(fraction) / 10 ** len(fraction)
+            times.append(total_time)
+
+        # Metadata only lines carry no lyrics
+        if not times:
+            continue
+
+        # Only enhanced lines need the word pass
+        lyric = line.group(2)
+        if "<" in lyric:
+            lyric, words = ParseWords(lyric)
+        else:
+            lyric, words = lyric.strip(), ()
+
+        if lyric == "":
+            lyric = empty_line
+            words = ()
+
+        # Repeated lines (e.g. a chorus) list every time they are sung, word times shift along
+        for total_time in times:
+            shift = total_time - times[0]
+            entries.append((total_time, lyric, [(word_time + shift, word_end) for word_time, word_end in words] if shift else words))
+
+    # Positive offsets make the lyrics show up sooner
+    try:
+        offset = int(metadata.get("offset", 0)) / 1000
+    except ValueError:
+        offset = 0
+
+    entries.sort(key=lambda entry: entry[0])
+
+    # Intern the texts, ids are given out in order of first appearance
+    text_ids = {}
+    line_ids = array('i')
+    word_starts = array('i', [0])
+    word_times = array('d')
+    word_ends = array('i')
+    for _, lyric, words in entries:
+        line_ids.append(text_ids.setdefault(lyric, len(text_ids)))
+        for word_time, word_end in words:
+            word_times.append(max(word_time - offset, 0))
+            word_ends.append(word_end)
+        word_starts.append(len(word_times))
+
+    return Timeline(
+        array('d', [max(total_time - offset, 0) for total_time, _, _ in entries]),
+        line_ids,
+        tuple(text_ids),
+        MappingProxyType(metadata),
+        word_starts,
+        word_times,
+        word_ends
+    )
+
+
+class WordCursor:
+    def __init__(self, timeline):
+        self.timeline = timeline
+        self.ind = -1
+
+    def Seek(self, position):
+        # Index of the last word started by position. While playing forward this only ever
+        # steps to the next word, a bisect is only needed after seeks
+        word_times = self.timeline.word_times
+        ind = self.ind
+
+        if ind + 1 < len(word_times) and word_times[ind + 1] <= position:
+            if ind + 2 >= len(word_times) or word_times[ind + 2] > position:
+                ind += 1
+            else:
+                ind = bisect_right(word_times, position) - 1
+        elif ind >= 0 and word_times[ind] > position:
+            ind = bisect_right(word_times, position) - 1
+
+        self.ind = ind
+        return ind
+
+    def SungCharacters(self, line_ind, position):
+        # How many characters of a line have been sung, None if the line has no word timings
+        word_starts = self.timeline.word_starts
+        if line_ind < 0 or line_ind + 1 >= len(word_starts):
+            return None
+
+        first_word = word_starts[line_ind]
+        last_word = word_starts[line_ind + 1] - 1
+        if last_word < first_word:
+            return None
+
+        ind = self.Seek(position)
+        if ind < first_word:
+            return 0
+        if ind > last_word:
+            return len(self.timeline.texts[self.timeline.line_ids[line_ind]])
+        return self.timeline.word_ends[ind]
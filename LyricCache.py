@@ -0,0 +1,158 @@
+import sqlite3
+import threading
+import time
+
+
+
+class LyricCache:
+    def __init__(self, cache_file="lyrics.db", max_entries=2000, miss_ttl=7 * 24 * 3600, error_ttl=300):
+
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+        # How long a recorded miss is trusted, genuine misses much longer than network errors
+        self.ttls = {"miss": miss_ttl, "error": error_ttl}
+
+        # An unwritable working directory (or a broken file) only costs us persistence
+        try:
+            self.connection = self.Open(self.cache_file)
+        except sqlite3.Error as e:
+            print(f"[LyricCache] Failed to open {self.cache_file}, caching in memory: {e}")
+            self.connection = self.Open(":memory:")
+
+    def Open(self, cache_file):
+        connection = sqlite3.connect(cache_file, check_same_thread=False)
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS lyrics (
+                track_id TEXT PRIMARY KEY,
+                track_name TEXT NOT NULL,
+                artist_name TEXT NOT NULL,
+                album_name TEXT NOT NULL,
+                duration INTEGER NOT NULL,
+                synced_lyrics TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS lyrics_track ON lyrics (track_name, artist_name, album_name, duration)")
+        connection.execute("CREATE INDEX IF NOT EXISTS lyrics_last_used ON lyrics (last_used)")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS misses (
+                track_id TEXT PRIMARY KEY,
+                track_name TEXT NOT NULL,
+                artist_name TEXT NOT NULL,
+                album_name TEXT NOT NULL,
+                duration INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                recorded_at REAL NOT NULL
+            )
+        """)
+        connection.commit()
+        return connection
+
+    def Get(self, track_id, track_name, artist_name, album_name, duration):
+        # Returns (synced_lyrics, fetched_at). Looks up by Spotify id first, then by the lrclib lookup tuple (relinked tracks get new ids)
+        with self.lock:
+            try:
+                row = self.connection.execute(
+                    "SELECT track_id, synced_lyrics, fetched_at FROM lyrics WHERE track_id = ?",
+                    (track_id,)
+                ).fetchone()
+
+                if row is None:
+                    row = self.connection.execute(
+                        "SELECT track_id, synced_lyrics, fetched_at FROM lyrics WHERE track_name = ? AND artist_name = ? AND album_name = ? AND duration = ?",
+                        (track_name, artist_name, album_name, duration)
+                    ).fetchone()
+
+                if row is None:
+                    return None
+
+                self.connection.execute("UPDATE lyrics SET last_used = ? WHERE track_id = ?", (time.time(), row[0]))
+                self.connection.commit()
+                return row[1], row[2]
+
+            except sqlite3.Error as e:
+                print(f"[LyricCache] Failed to read lyrics: {e}")
+                return None
+
+    def Put(self, track_id, track_name, artist_name, album_name, duration, synced_lyrics):
+        now = time.time()
+
+        with self.lock:
+            try:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO lyrics VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (track_id, track_name, artist_name, album_name, duration, synced_lyrics, now, now)
+                )
+
+                self.connection.execute("DELETE FROM misses WHERE track_id = ?", (track_id,))
+
+                # Evict the least recently used entries once we are over the limit
+                self.connection.execute(
+                    "DELETE FROM lyrics WHERE track_id IN (SELECT track_id FROM lyrics ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+                self.connection.commit()
+
+            except sqlite3.Error as e:
+                print(f"[LyricCache] Failed to store lyrics: {e}")
+
+    def Refresh(self, track_id, track_name, artist_name, album_name, duration, fetched_at):
+        # Move the stored lyrics' age to fetched_at without touching them, matched like Get
+        with self.lock:
+            try:
+                self.connection.execute(
+                    "UPDATE lyrics SET fetched_at = ? WHERE track_id = ? OR (track_name = ? AND artist_name = ? AND album_name = ? AND duration = ?)",
+                    (fetched_at, track_id, track_name, artist_name, album_name, duration)
+                )
+                self.connection.commit()
+
+            except sqlite3.Error as e:
+                print(f"[LyricCache] Failed to refresh lyrics: {e}")
+
+    def GetMiss(self, track_id, track_name, artist_name, album_name, duration):
+        # Kind of the recorded miss ("miss" or "error") if it is still fresh, None otherwise
+        with self.lock:
+            try:
+                row = self.connection.execute(
+                    "SELECT kind, recorded_at FROM misses WHERE track_id = ? OR (track_name = ? AND artist_name = ? AND album_name = ? AND duration = ?)",
+                    (track_id, track_name, artist_name, album_name, duration)
+                ).fetchone()
+
+            except sqlite3.Error as e:
+                print(f"[LyricCache] Failed to read misses: {e}")
+                return None
+
+        if row is None or time.time() - row[1] > self.ttls.get(row[0], 0):
+            return None
+        return row[0]
+
+    def PutMiss(self, track_id, track_name, artist_name, album_name, duration, kind="miss"):
+        now = time.time()
+
+        with self.lock:
+            try:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO misses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (track_id, track_name, artist_name, album_name, duration, kind, now)
+                )
+
+                # Drop expired misses, then the oldest ones once we are over the limit
+                self.connection.execute(
+                    "DELETE FROM misses WHERE (kind = 'miss' AND recorded_at < ?) OR (kind = 'error' AND recorded_at < ?)",
+                    (now - self.ttls["miss"], now - self.ttls["error"])
+                )
+                self.connection.execute(
+                    "DELETE FROM misses WHERE track_id IN (SELECT track_id FROM misses ORDER BY recorded_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+                self.connection.commit()
+
+            except sqlite3.Error as e:
+                print(f"[LyricCache] Failed to store miss: {e}")
+
+    def Close(self):
+        with self.lock:
+            self.connection.close()
@@ -1,7 +1,13 @@
 import sys
-from PyQt6.QtWidgets import QApplication, QMainWindow, QLabel, QGraphicsOpacityEffect
-from PyQt6.QtCore import Qt, QPropertyAnimation, QEasingCurve, QParallelAnimationGroup, pyqtProperty
-from PyQt6.QtGui import QFont, QFontMetrics, QKeyEvent
+import html
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6.QtWidgets import QApplication, QMainWindow, QLabel, QGraphicsOpacityEffect, QWidget
+from PyQt6.QtCore import Qt, QObject, QPropertyAnimation, QEasingCurve, QParallelAnimationGroup, QRect, QRectF, QTimer, pyqtProperty, pyqtSignal
+from PyQt6.QtGui import QColor, QFont, QFontMetrics, QImage, QKeyEvent, QPainter, QStaticText, QTextOption
+
+from LrcParser import WordCursor
 
 
 
@@ -9,10 +15,14 @@ class CustomLabel(QLabel):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._font_size = 10
-        self._font_family = "Arial"
         self._y_position = 0
+        self._font = None
+
+        # Timeline text id (or the text itself) of what the label shows
+        self.line_key = None
 
         self.setWordWrap(True)
+        self.setTextFormat(Qt.TextFormat.PlainText)
 
         # Create an opacity effect for the label
         self._opacity_effect = QGraphicsOpacityEffect()
@@ -26,8 +36,7 @@ class CustomLabel(QLabel):
     @font_size.setter
     def font_size(self, size):
         self._font_size = size
-        # Update position when font size changes to relatively center it
-        self.update_position()
+        self.update_font()
 
     @pyqtProperty(float)
     def opacity(self):
@@ -50,33 +59,265 @@ class CustomLabel(QLabel):
         self.update_position()
 
     def update_position(self):
-        if self.parent():
-            self._font_family = self.parent().chosen_font
+        # y_position is the top edge, DisplayWindow already accounts for the wrapped height
+        y_pos = int(self._y_position)
+        if y_pos != self.y():
+            self.move(0, y_pos)
+
+    def update_font(self):
+        parent = self.parent()
+
+        # Only swap fonts when the rounded size actually changes
+        font, _ = CachedFont(parent.chosen_font, int(self._font_size), parent.chosen_bold, parent.chosen_italic, parent.chosen_underline)
+        if font is not self._font:
+            self._font = font
+            self.setFont(font)
+
+    def apply_style(self, size):
+        # Color and padding never change while animating, so this is the only stylesheet we set
+        self.setStyleSheet(f"color: {self.parent().chosen_color}; padding-left: 20px; padding-right: 20px;")
+
+        self._font_size = size
+        self._font = None
+        self.update_font()
+
+
+
+# Text alignment of the lines for each chosen_alignment
+LINE_ALIGNMENTS = (
+    Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop,
+    Qt.AlignmentFlag.AlignHCenter | Qt.AlignmentFlag.AlignTop,
+    Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignTop
+)
+
+# Properties every line animates between its start and target values
+ANIMATED_PROPERTIES = (b"y_position", b"font_size", b"opacity")
+
+# Fonts and their heights, shared by all labels
+FONT_CACHE = {}
+
+def MakeFont(family, size, bold, italic, underline):
+    font = QFont(family)
+    font.setPixelSize(max(size, 1))
+    font.setBold(bold)
+    font.setItalic(italic)
+    font.setUnderline(underline)
+    return font
+
+def CachedFont(family, size, bold, italic, underline):
+    key = (family, size, bold, italic, underline)
+    entry = FONT_CACHE.get(key)
+
+    if entry is None:
+        font = MakeFont(family, size, bold, italic, underline)
+        entry = (font, QFontMetrics(font).height())
+        FONT_CACHE[key] = entry
+
+    return entry
+
+def MeasureLines(lines, family, sizes, bold, italic, underline, width):
+    # Wrapped height of every (key, text) line at every size, keyed by (key, size). Builds its own
+    # fonts and only uses reentrant classes, so it can run on a worker thread
+    heights = {}
+    for size in sizes:
+        metrics = QFontMetrics(MakeFont(family, size, bold, italic, underline))
+        line_height = metrics.height()
+        for key, text in lines:
+            rect = metrics.boundingRect(QRect(0, 0, width, 1 << 20), Qt.TextFlag.TextWordWrap.value, text)
+            heights[(key, size)] = max(rect.height(), line_height)
+    return heights
+
+def RenderLines(lines, family, bold, italic, underline, color, alignment, width, ratio):
+    # Rasterize (text, size) lines for RenderCache. QImage and QPainter are fine to use on a worker thread
+    images = []
+    for text, size in lines:
+        font = MakeFont(family, size, bold, italic, underline)
+        flags = LINE_ALIGNMENTS[alignment].value | Qt.TextFlag.TextWordWrap.value
+        height = max(QFontMetrics(font).boundingRect(QRect(0, 0, width, 1 << 20), flags, text).height(), 1)
+
+        image = QImage(int(width * ratio), int(height * ratio), QImage.Format.Format_ARGB32_Premultiplied)
+        image.setDevicePixelRatio(ratio)
+        image.fill(Qt.GlobalColor.transparent)
+
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.RenderHint.TextAntialiasing)
+        painter.setFont(font)
+        painter.setPen(QColor(color))
+        painter.drawText(QRect(0, 0, width, height), flags, text)
+        painter.end()
+
+        images.append(image)
+    return images
+
+
+
+# Least recently used pre-rendered lines, only touched on the GUI thread
+class RenderCache:
+    def __init__(self, max_entries=48):
+        self.max_entries = max_entries
+        self.images = OrderedDict()
+
+    def Get(self, key):
+        image = self.images.get(key)
+        if image is not None:
+            self.images.move_to_end(key)
+        return image
+
+    def Put(self, key, image):
+        self.images[key] = image
+        self.images.move_to_end(key)
+        while len(self.images) > self.max_entries:
+            self.images.popitem(last=False)
+
+
+
+
+# A lyric line drawn by LyricCanvas, animated through the same properties as CustomLabel
+class PaintedLine(QObject):
+    def __init__(self, text, canvas):
+        super().__init__(canvas)
+        self.canvas = canvas
+        self.display = canvas.parent()
+
+        self._font_size = 10
+        self._y_position = 0
+        self._opacity = 1.0
+        self._font = None
+        self._text_height = 0
+        self._y = 0
+        self._painted_height = 0
+        self.line_key = None
+
+        self.static_text = QStaticText(text)
+        self.static_text.setTextWidth(600)
+        self.static_text.setTextFormat(Qt.TextFormat.PlainText)
+
+    def text(self):
+        return self.static_text.text()
+
+    def setText(self, text):
+        if text != self.static_text.text():
+            self.static_text.setText(text)
+            self.invalidate()
+
+    def setTextFormat(self, text_format):
+        self.static_text.setTextFormat(text_format)
+
+    def setAlignment(self, alignment):
+        option = QTextOption(alignment)
+        option.setWrapMode(QTextOption.WrapMode.WordWrap)
+        self.static_text.setTextOption(option)
+        self.invalidate()
+
+    @pyqtProperty(float)
+    def font_size(self):
+        return self._font_size
+
+    @font_size.setter
+    def font_size(self, size):
+        self._font_size = size
+        self.update_position()
+
+    @pyqtProperty(float)
+    def opacity(self):
+        return self._opacity
+
+    @opacity.setter
+    def opacity(self, value):
+        if value != self._opacity:
+            self._opacity = value
+            self.invalidate()
+
+    @pyqtProperty(float)
+    def y_position(self):
+        return self._y_position
+
+    @y_position.setter
+    def y_position(self, value):
+        self._y_position = value
+        self.update_position()
+
+    def update_position(self):
+        font_changed = self.update_font()
+
+        y_pos = int(self._y_position)
+        if y_pos != self._y or font_changed:
+            self.invalidate()
+            self._y = y_pos
+            self.invalidate()
+
+    def update_font(self):
+        display = self.display
+        font, text_height = CachedFont(display.chosen_font, int(self._font_size), display.chosen_bold, display.chosen_italic, display.chosen_underline)
+        if font is self._font:
+            return False
+
+        self._font = font
+        self._text_height = text_height
+        return True
+
+    def apply_style(self, size):
+        self._font_size = size
+        self._font = None
+        self.update_font()
+        self.invalidate()
 
-        # Calculate y position based on font size
-        font = QFont(self._font_family, int(self._font_size))
-        font.setBold(True)
-        metrics = QFontMetrics(font)
-        text_height = metrics.height()
+    def invalidate(self):
+        # Only the band this line covers needs repainting, leave room for the font growing
+        height = max(self._painted_height, self._text_height) * 2
+        self.canvas.update(0, self._y, self.canvas.width(), height)
 
-        y_pos = int(self._y_position - (text_height // 2))
-        self.setGeometry(0, y_pos, 640, 1080)
+    def paint(self, painter, color):
+        if self._opacity <= 0.0 or not self.static_text.text() or self._font is None:
+            return
 
-        font_type = ""
-        if self.parent().chosen_italic: font_type += "italic "
-        if self.parent().chosen_bold: font_type += "bold "
+        painter.setOpacity(self._opacity)
 
-        style_sheet = f"font: {font_type}{self._font_size}px {self._font_family}; color: {self.parent().chosen_color if self.parent() else '#FFFFFF'}; padding-left: 20px; padding-right: 20px;"
-        if self.parent().chosen_underline: style_sheet += "text-decoration: underline;"
+        # Composite the pre-rendered copy while the line rests at the size it was rendered at
+        if self.static_text.textFormat() == Qt.TextFormat.PlainText:
+            image = self.display.Prerendered(self.line_key, int(self._font_size))
+            if image is not None:
+                height = image.height() / image.devicePixelRatio()
+                painter.drawImage(QRectF(20, self._y, self.display.text_width, height), image)
+                self._painted_height = int(height) + 1
+                return
 
+        painter.setFont(self._font)
+        painter.setPen(color)
+        painter.drawStaticText(20, self._y, self.static_text)
+        self._painted_height = int(self.static_text.size().height()) + 1
 
-        self.setStyleSheet(style_sheet)
+    def deleteLater(self):
+        self.invalidate()
+        super().deleteLater()
 
 
+# One widget painting every visible line, no per-line widgets or offscreen opacity effects
+class LyricCanvas(QWidget):
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.setGeometry(0, 0, 640, 1080)
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents, True)
+        self.lines = []
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.TextAntialiasing)
+
+        color = QColor(self.parent().chosen_color)
+        for line in self.lines:
+            painter.save()
+            line.paint(painter, color)
+            painter.restore()
+
+        painter.end()
 
 
 class DisplayWindow(QMainWindow):
-    def __init__(self, font="Arial", size=40, color="#FFFFFF", opacity=0.8, position=(2, 1), alignment=2, bold=False, italic=False, underline=False):
+    layout_ready = pyqtSignal(int, object)
+    prerender_ready = pyqtSignal(int, object, object)
+
+    def __init__(self, font="Arial", size=40, color="#FFFFFF", opacity=0.8, position=(2, 1), alignment=2, bold=False, italic=False, underline=False, renderer="labels", lines=3, motion="jump"):
         super().__init__()
 
         # Set the size
@@ -106,107 +347,269 @@ class DisplayWindow(QMainWindow):
         self.chosen_opacity = opacity
         self.chosen_position = position
         self.chosen_alignment = alignment
+        self.chosen_lines = min(max(lines, 1), 15)
         self.wrap_length = 576
 
-        self.lyrics0 = CustomLabel("Old lyrics", self)
-        self.lyrics1 = CustomLabel("Current lyrics", self)
-        self.lyrics2 = CustomLabel("Future lyrics", self)
-        self.lyrics3 = CustomLabel("Hidden lyrics", self)
-
-        self.lyrics_arr = [self.lyrics0, self.lyrics1, self.lyrics2, self.lyrics3]
-
-        self.CalculatePositions()
-
-        for ind, lyrics in enumerate(self.lyrics_arr):
-            lyrics.setGeometry(0, int(self.start_pos[ind]), 640, 1080)
-
+        # "labels" uses a QLabel per line, "painter" draws every line on a single canvas
+        self.chosen_renderer = renderer
+        self.canvas = None
+
+        # "jump" runs a property animation per line and transition, "scroll" keeps every line moving
+        # from a single frame timer that follows the playback clock
+        self.chosen_motion = motion
+
+        # One more line than is visible, the extra one fades out while the next fades in. The lines are a
+        # ring: slot i (top to bottom) is lyrics_arr[(ring_start + i) % len(lyrics_arr)], so moving on to
+        # the next line rotates ring_start and only the line that wrapped around gets a new text
+        self.lyrics_arr = []
+        self.ring_start = 0
+        self.line_texts = ["Old lyrics", "Current lyrics", "Future lyrics", "Hidden lyrics"]
+        self.line_keys = list(self.line_texts)
+
+        # Wrapped heights of the current timeline's lines, measured on a worker whenever the
+        # timeline or the font changes. Keyed by (line key, pixel size), where the line key is the
+        # timeline's text id, or the text itself for lines that are not in the timeline
+        self.text_width = 600
+        self.layout_timeline = None
+        self.layout_version = 0
+        self.line_heights = {}
+        self.layout_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="LyricLayout")
+        self.layout_ready.connect(self.LayoutReady)
+
+        # The painter renderer composites lines rasterized ahead of time on the layout worker,
+        # keyed by (line key, pixel size) and dropped along with the heights
+        self.prerender_lines = 3
+        self.render_cache = RenderCache()
+        self.prerendering = set()
+        self.prerender_ready.connect(self.PrerenderReady)
+
+        # Transitions take up to animation_duration ms, less when the next line comes sooner
         self.animation_duration = 500
+        self.min_animation_duration = 120
+        self.animation_group = None
         self.is_animating = False
+        self.shown_line = None
+
+        # Scroll motion: playback positions the scroll from the current line to the next one starts and
+        # ends at, and the last offset between them (0 to 1) the lines were placed at
+        self.scroll_start = 0.0
+        self.scroll_end = 0.0
+        self.scroll_offset = None
+        self.scroll_curve = QEasingCurve(QEasingCurve.Type.InOutQuad)
+        self.scroll_timer = QTimer(self)
+        self.scroll_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.scroll_timer.setInterval(16)
+        self.scroll_timer.timeout.connect(self.ScrollFrame)
 
-        self.LoadLyricsStyle()
+        self.CalculatePositions()
+        self.CreateLines()
+
+        # Word level (enhanced lrc) highlighting of the current line
+        self.word_source = None
+        self.word_cursor = None
+        self.word_state = None
+        self.word_item = None
+        self.word_line_text = ""
+        self.word_line = -1
+        self.word_timer = QTimer(self)
+        self.word_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.word_timer.setInterval(16)
+        self.word_timer.timeout.connect(self.UpdateWords)
 
+        self.LoadLyricsStyle()
 
 
-    def LoadLyricsStyle(self):
-        for ind, lyrics in enumerate(self.lyrics_arr):
-            if self.chosen_alignment == 0:
-                lyrics.setAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop)
-            elif self.chosen_alignment == 1:
-                lyrics.setAlignment(Qt.AlignmentFlag.AlignHCenter | Qt.AlignmentFlag.AlignTop)
-            elif self.chosen_alignment == 2:
-                lyrics.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignTop)
 
-            font_type = ""
-            if self.chosen_italic: font_type += "italic "
-            if self.chosen_bold: font_type += "bold "
+    def Slot(self, slot):
+        return self.lyrics_arr[(self.ring_start + slot) % len(self.lyrics_arr)]
+
+    def CreateLines(self):
+        texts = self.line_texts
+        keys = self.line_keys
+        self.ring_start = 0
+        self.shown_line = None
+        self.word_state = None
+
+        # Drop the lines of the previous renderer along with their animations
+        self.StopTransition()
+        if self.animation_group:
+            self.animation_group.deleteLater()
+            self.animation_group = None
+        for lyrics in self.lyrics_arr:
+            lyrics.deleteLater()
+        if self.canvas:
+            self.canvas.deleteLater()
+            self.canvas = None
+
+        if self.chosen_renderer == "painter":
+            self.canvas = LyricCanvas(self)
+            self.lyrics_arr = [PaintedLine(text, self.canvas) for text in texts]
+            for lyrics, key in zip(self.lyrics_arr, keys):
+                lyrics.line_key = key
+            self.canvas.lines = self.lyrics_arr
+            self.canvas.show()
+        else:
+            self.lyrics_arr = [CustomLabel(text, self) for text in texts]
+            for lyrics in self.lyrics_arr:
+                lyrics.setGeometry(0, 0, 640, 1080)
+                lyrics.show()
 
-            style_sheet = f"font: {font_type}{self.start_size[ind]}px {self.chosen_font}; color: {self.chosen_color}; padding-left: 20px; padding-right: 20px;"
-            if self.chosen_underline: style_sheet += "text-decoration: underline;"
+        self.CreateAnimations()
+        self.ResetLines()
 
-            self.lyrics_arr[ind].setStyleSheet(style_sheet)
+    def LoadLyricsStyle(self):
+        for slot in range(len(self.lyrics_arr)):
+            lyrics = self.Slot(slot)
+            lyrics.setAlignment(LINE_ALIGNMENTS[self.chosen_alignment])
+            lyrics.apply_style(self.start_size[slot])
 
     def keyPressEvent(self, event: QKeyEvent):
         if event.key() == Qt.Key.Key_Space and not self.is_animating:
+            self.ResetLines()
             self.Animate()
         super().keyPressEvent(event)
 
-    def Animate(self):
-        self.is_animating = True
+    def CreateAnimations(self):
+        # One animation per line and property, created with the lines and reused for every transition.
+        # Scrolling sets the properties itself and needs none
+        self.animations = []
+        if self.chosen_motion == "scroll":
+            return
+
+        self.animation_group = QParallelAnimationGroup(self)
+
+        for lyrics in self.lyrics_arr:
+            line_animations = []
+            for name in ANIMATED_PROPERTIES:
+                animation = QPropertyAnimation(lyrics, name, self.animation_group)
+                animation.setEasingCurve(QEasingCurve.Type.InOutQuad)
+                self.animation_group.addAnimation(animation)
+                line_animations.append(animation)
+            self.animations.append(line_animations)
 
-        # Create animation group
-        self.animation_group = QParallelAnimationGroup()
-
-        for i, lyrics in enumerate(self.lyrics_arr):
-
-            start_pos = self.start_pos[i]
-            start_size = self.start_size[i]
-
-            target_pos = self.target_pos[i]
-            target_size = self.target_size[i]
-
-            if i == 0:
-                start_opacity = 1.0
-                target_opacity = 0.0
-            elif i == 3:
-                start_opacity = 0.0
-                target_opacity = 1.0
-            else:
-                start_opacity = 1.0
-                target_opacity = 1.0
-
-            # Create position animation
-            pos_animation = QPropertyAnimation(lyrics, b"y_position")
-            pos_animation.setDuration(self.animation_duration)
-            pos_animation.setStartValue(start_pos)
-            pos_animation.setEndValue(target_pos)
-            pos_animation.setEasingCurve(QEasingCurve.Type.InOutQuad)
-
-            # Create font size animation
-            size_animation = QPropertyAnimation(lyrics, b"font_size")
-            size_animation.setDuration(self.animation_duration)
-            size_animation.setStartValue(start_size)
-            size_animation.setEndValue(target_size)
-            size_animation.setEasingCurve(QEasingCurve.Type.InOutQuad)
-
-            # Create opacity animation
-            opacity_animation = QPropertyAnimation(lyrics, b"opacity")
-            opacity_animation.setDuration(self.animation_duration)
-            opacity_animation.setStartValue(start_opacity)
-            opacity_animation.setEndValue(target_opacity)
-            opacity_animation.setEasingCurve(QEasingCurve.Type.InOutQuad)
-
-            self.animation_group.addAnimation(pos_animation)
-            self.animation_group.addAnimation(size_animation)
-            self.animation_group.addAnimation(opacity_animation)
-
-
-        # Start animation
         self.animation_group.finished.connect(self.on_animation_finished)
+
+    def ResetSlot(self, slot):
+        lyrics = self.Slot(slot)
+        lyrics.font_size = self.start_size[slot]
+        lyrics.y_position = self.start_pos[slot]
+        lyrics.opacity = self.start_opacity[slot]
+
+    def ResetLines(self):
+        # Put every line back where a transition starts
+        self.StopTransition()
+
+        for slot in range(len(self.lyrics_arr)):
+            self.ResetSlot(slot)
+
+    def RotateLines(self):
+        # Every line moves up a slot and carries on from wherever it is right now, the line that
+        # faded out wraps around to the bottom as the next hidden line
+        self.StopTransition()
+        self.ring_start = (self.ring_start + 1) % len(self.lyrics_arr)
+        self.ResetSlot(len(self.lyrics_arr) - 1)
+
+    def TransitionDuration(self, wait_time):
+        # Leave most of the gap to the next line for reading it
+        if wait_time <= 0:
+            return self.animation_duration
+        return int(min(max(wait_time * 1000 / 2, self.min_animation_duration), self.animation_duration))
+
+    def StopTransition(self):
+        if self.animation_group:
+            self.animation_group.stop()
+        self.scroll_timer.stop()
+        self.is_animating = False
+
+    def Animate(self, duration=None):
+        duration = duration or self.animation_duration
+        if self.chosen_motion == "scroll":
+            self.Scroll()
+            return
+
+        # Retarget the pooled animations from the lines' current values
+        self.animation_group.stop()
+        self.is_animating = True
+
+        for slot in range(len(self.lyrics_arr)):
+            ind = (self.ring_start + slot) % len(self.lyrics_arr)
+            lyrics = self.lyrics_arr[ind]
+            targets = (self.target_pos[slot], self.target_size[slot], self.target_opacity[slot])
+            for animation, target in zip(self.animations[ind], targets):
+                animation.setDuration(duration)
+                animation.setStartValue(float(getattr(lyrics, animation.propertyName().data().decode())))
+                animation.setEndValue(float(target))
+
         self.animation_group.start()
+
     def on_animation_finished(self):
         self.is_animating = False
+        self.LinesSettled()
+
+    def LinesSettled(self):
+        # Lines at rest can use their pre-rendered copies
+        if self.canvas:
+            self.canvas.update()
+
+    def ScrollPosition(self):
+        # Playback position if there is a clock to follow, wall time otherwise
+        clock = self.word_source.clock if self.word_source else None
+        if clock is None:
+            return time.monotonic()
+        return clock.Position()
+
+    def SetScrollWindow(self, frame):
+        # The scroll spans the gap between the frame's line and the next one. frame.clock + wait_time is
+        # when the next line is due, the timestamps say when this one was, even if we got here by seeking
+        if self.word_source is None:
+            self.scroll_end = self.ScrollPosition() + frame.wait_time
+            self.scroll_start = self.scroll_end - frame.wait_time
+            return
+
+        self.scroll_end = frame.clock + frame.wait_time
+        self.scroll_start = frame.clock
+        timestamps = self.word_source.timeline.timestamps if self.word_source.timeline else ()
+        if frame.wait_time > 0 and 0 <= frame.index < len(timestamps) - 1:
+            self.scroll_start = self.scroll_end - (timestamps[frame.index + 1] - timestamps[frame.index])
+
+    def Scroll(self):
+        # ScrollFrame places the lines on every tick until they reach the next line
+        self.scroll_offset = None
+        self.ScrollFrame()
+        if self.scroll_offset < 1.0 and self.scroll_end > self.scroll_start:
+            self.scroll_timer.start()
+
+    def ScrollFrame(self):
+        # One offset from the playback position, eased across the gap, places every line between its
+        # resting place for this line (start_*) and for the next one (target_*)
+        if self.scroll_end > self.scroll_start:
+            offset = min(max((self.ScrollPosition() - self.scroll_start) / (self.scroll_end - self.scroll_start), 0.0), 1.0)
+        else:
+            offset = 0.0
+
+        # Paused, nothing to move until playback carries on
+        if offset == self.scroll_offset:
+            if self.is_animating:
+                self.is_animating = False
+                self.LinesSettled()
+            return
+        self.scroll_offset = offset
+        self.is_animating = True
+
+        eased = self.scroll_curve.valueForProgress(offset)
+        for slot in range(len(self.lyrics_arr)):
+            lyrics = self.Slot(slot)
+            lyrics.y_position = self.start_pos[slot] + (self.target_pos[slot] - self.start_pos[slot]) * eased
+            lyrics.font_size = self.start_size[slot] + (self.target_size[slot] - self.start_size[slot]) * eased
+            lyrics.opacity = self.start_opacity[slot] + (self.target_opacity[slot] - self.start_opacity[slot]) * eased
+
+        # At the next line, its frame takes over
+        if offset >= 1.0 or self.scroll_end <= self.scroll_start:
+            self.scroll_timer.stop()
+            self.is_animating = False
+            self.LinesSettled()
 
-    def UpdateCustomization(self, font="Arial", size=40, color="#FFFFFF", opacity=0.8, position=(2, 1), alignment=2, bold=False, italic=False, underline=False):
+    def UpdateCustomization(self, font="Arial", size=40, color="#FFFFFF", opacity=0.8, position=(2, 1), alignment=2, bold=False, italic=False, underline=False, renderer="labels", lines=3, motion="jump"):
 
         # Set the window position
         self.setGeometry(640 * position[0], 0, 640, 1080)
@@ -220,8 +623,18 @@ class DisplayWindow(QMainWindow):
         self.chosen_bold = bold
         self.chosen_italic = italic
         self.chosen_underline = underline
+        self.chosen_lines = min(max(lines, 1), 15)
+
+        # Rebuild the lines if the renderer, the motion or the number of lines changed
+        rebuild = renderer != self.chosen_renderer or motion != self.chosen_motion
+        self.chosen_renderer = renderer
+        self.chosen_motion = motion
 
         self.CalculatePositions()
+        self.MeasureTimeline()
+
+        if rebuild or len(self.line_texts) != len(self.lyrics_arr):
+            self.CreateLines()
 
         # Update window opacity
         self.setWindowOpacity(opacity / 100.0)
@@ -233,29 +646,257 @@ class DisplayWindow(QMainWindow):
     def CalculatePositions(self):
         new_dist = self.chosen_size * 6 / 5
 
-        if (self.chosen_position[1] == 0):
-            self.start_pos = [new_dist * 3, new_dist * 6, new_dist * 9, new_dist * 12]
-            self.target_pos = [0, new_dist * 3, new_dist * 6, new_dist * 9]
-
-        elif (self.chosen_position[1] == 1):
-            self.start_pos = [600 - new_dist * 4.5, 600 - new_dist * 1.5, 600 + new_dist * 1.5, 600 + new_dist * 4.5]
-            self.target_pos = [600 - new_dist * 7.5, 600 - new_dist * 4.5, 600 - new_dist * 1.5, 600 + new_dist * 1.5]
+        # Visible lines before and after the current one, which rests in current_slot (slot 0 is fading out)
+        visible_after = self.chosen_lines - 1 - (self.chosen_lines - 1) // 2
+        self.window_before = (self.chosen_lines - 1) // 2
+        self.current_slot = self.window_before + 1
 
+        # A transition brings the line in focus_target to where the one in focus_start rested. Jumping
+        # settles on the current line, scrolling heads for the next one and needs one more line to fade in
+        if self.chosen_motion == "scroll":
+            self.window_after = visible_after + 1
+            focus_start, focus_target = self.current_slot, self.current_slot + 1
         else:
-            self.start_pos = [1080 - new_dist * 10, 1080 - new_dist * 7, 1080 - new_dist * 4, 1080 - new_dist * 1]
-            self.target_pos = [1080 - new_dist * 13, 1080 - new_dist * 10, 1080 - new_dist * 7, 1080 - new_dist * 4]
-
-        self.start_size = [self.chosen_size / 1.5, self.chosen_size, self.chosen_size / 1.5, self.chosen_size / 3]
-        self.target_size = [self.chosen_size / 3, self.chosen_size / 1.5, self.chosen_size, self.chosen_size / 1.5]
-
+            self.window_after = visible_after
+            focus_start, focus_target = self.current_slot - 1, self.current_slot
+        self.focus_slots = (focus_start, focus_target)
+        line_count = self.window_before + self.window_after + 2
 
-    def UpdateLyrics(self, lyrics_data):
-        if len(lyrics_data) >= 4:
-            for i, lyric in enumerate(lyrics_data[:4]):
-                if i < len(self.lyrics_arr):
-                    self.lyrics_arr[i].setText(lyric)
+        if len(self.line_texts) != line_count:
+            self.line_texts = [""] * line_count
+            self.line_keys = [""] * line_count
 
-            if not self.is_animating:
-                self.Animate()
+        # Centers of single line lyrics, squeezed together if they would not fit. LayoutLines makes room for wrapped ones
+        step = min(new_dist * 3, 1080 / (self.chosen_lines + 0.5))
+        if (self.chosen_position[1] == 0):
+            first = 0
+        elif (self.chosen_position[1] == 1):
+            first = 600 - step / 2 - step * self.current_slot
+        else:
+            first = 1080 - step * 4 / 3 - step * self.chosen_lines
+
+        # Distance of every slot from the line in focus before and after a transition
+        start_distance = [slot - focus_start for slot in range(line_count)]
+        target_distance = [slot - focus_target for slot in range(line_count)]
+
+        self.start_center = [first + step * (self.current_slot + distance) for distance in start_distance]
+        self.target_center = [first + step * (self.current_slot + distance) for distance in target_distance]
+
+        # The oldest line fades out, the hidden one fades in
+        self.start_size, self.start_opacity = map(list, zip(*(self.SlotState(distance, visible_after) for distance in start_distance)))
+        self.target_size, self.target_opacity = map(list, zip(*(self.SlotState(distance, visible_after) for distance in target_distance)))
+
+        # Pixel sizes lines rest at between transitions
+        self.layout_sizes = tuple(sorted({int(size) for size in self.start_size + self.target_size}))
+
+        # Only sizes visible lines rest at are pre-rendered, the cache holds every line Prerender asks for
+        sizes = zip(self.start_size + self.target_size, self.start_opacity + self.target_opacity)
+        self.render_sizes = tuple(sorted({int(size) for size, opacity in sizes if opacity > 0}))
+        self.render_cache.max_entries = (line_count + self.prerender_lines) * len(self.render_sizes)
+
+        self.LayoutLines(self.line_texts, self.line_keys)
+
+    def SlotSize(self, distance):
+        return self.chosen_size / min(1 + abs(distance) / 2, 3)
+
+    def SlotState(self, distance, visible_after):
+        # (size, opacity) of a line this far from the one in focus, the ones outside the window are hidden
+        if -self.window_before <= distance <= visible_after:
+            return self.SlotSize(distance), 1.0
+        return self.chosen_size / 3, 0.0
+
+    def LayoutSettings(self):
+        # Everything the wrapped heights depend on, besides the text
+        return (self.chosen_font, self.layout_sizes, self.chosen_bold, self.chosen_italic, self.chosen_underline)
+
+    def SetTimeline(self, timeline):
+        # A new track, measure all of its lines before they are needed
+        self.layout_timeline = timeline
+        self.MeasureTimeline()
+
+    def MeasureTimeline(self):
+        self.layout_version += 1
+        self.line_heights = {}
+        self.render_cache = RenderCache(self.render_cache.max_entries)
+        self.prerendering = set()
+        if self.layout_timeline is None:
+            return
+
+        # Every distinct text once, however often it is sung
+        version = self.layout_version
+        family, sizes, bold, italic, underline = self.LayoutSettings()
+        lines = list(enumerate(self.layout_timeline.texts))
+        future = self.layout_pool.submit(MeasureLines, lines, family, sizes, bold, italic, underline, self.text_width)
+        future.add_done_callback(lambda done: self.layout_ready.emit(version, done))
+
+    def LayoutReady(self, version, future):
+        # Results for an older timeline or font are dropped
+        if version != self.layout_version or future.exception():
+            return
+        self.line_heights.update(future.result())
+
+    def LineHeight(self, key, text, size):
+        height = self.line_heights.get((key, size))
+
+        # Not measured yet (or a status message), only this line is measured here
+        if height is None:
+            height = MeasureLines(((key, text),), self.chosen_font, (size,), self.chosen_bold, self.chosen_italic, self.chosen_underline, self.text_width)[(key, size)]
+            self.line_heights[(key, size)] = height
+        return height
+
+    def Prerender(self, ind):
+        # While line ind is on screen, rasterize the lines around it and the next few at every resting size
+        if self.chosen_renderer != "painter" or self.layout_timeline is None:
+            return
+
+        texts = self.layout_timeline.texts
+        keys = []
+        for line_id in self.layout_timeline.line_ids[max(ind - self.window_before, 0):ind + self.window_after + self.prerender_lines]:
+            for size in self.render_sizes:
+                key = (line_id, size)
+                if key not in self.prerendering and self.render_cache.Get(key) is None:
+                    self.prerendering.add(key)
+                    keys.append(key)
+
+        if keys:
+            version = self.layout_version
+            lines = [(texts[line_id], size) for line_id, size in keys]
+            future = self.layout_pool.submit(
+                RenderLines, lines, self.chosen_font, self.chosen_bold, self.chosen_italic, self.chosen_underline,
+                self.chosen_color, self.chosen_alignment, self.text_width, self.devicePixelRatioF()
+            )
+            future.add_done_callback(lambda done: self.prerender_ready.emit(version, keys, done))
+
+    def PrerenderReady(self, version, keys, future):
+        # Images for an older timeline or style are dropped
+        if version != self.layout_version:
+            return
+        self.prerendering.difference_update(keys)
+        if future.exception():
+            return
+        for key, image in zip(keys, future.result()):
+            self.render_cache.Put(key, image)
+
+    def Prerendered(self, key, size):
+        # The copy rendered at exactly this size, only between transitions. A scaled copy would wrap
+        # differently from StackLines and blur, so moving lines are drawn as text
+        if self.is_animating or size not in self.render_sizes:
+            return None
+        return self.render_cache.Get((key, size))
+
+    def StackLines(self, texts, keys, centers, sizes, current):
+        # Keep the current line's center, push the others away by however much taller than one line they are
+        heights = [self.LineHeight(key, text, int(size)) for text, key, size in zip(texts, keys, sizes)]
+        extras = [max(height - CachedFont(self.chosen_font, int(size), self.chosen_bold, self.chosen_italic, self.chosen_underline)[1], 0) for height, size in zip(heights, sizes)]
+        centers = list(centers)
+
+        shift = 0
+        for ind in range(current + 1, len(centers)):
+            shift += (extras[ind - 1] + extras[ind]) / 2
+            centers[ind] += shift
+
+        shift = 0
+        for ind in range(current - 1, -1, -1):
+            shift += (extras[ind] + extras[ind + 1]) / 2
+            centers[ind] -= shift
+
+        return [center - height / 2 for center, height in zip(centers, heights)]
+
+    def LayoutLines(self, texts, keys):
+        # Top edges of the lines before and after a transition, animation ticks only interpolate these
+        self.line_texts = list(texts)
+        self.line_keys = list(keys)
+        focus_start, focus_target = self.focus_slots
+        self.start_pos = self.StackLines(self.line_texts, self.line_keys, self.start_center, self.start_size, focus_start)
+        self.target_pos = self.StackLines(self.line_texts, self.line_keys, self.target_center, self.target_size, focus_target)
+
+
+    def UpdateLyrics(self, frame):
+        # Frames made for another number of lines are dropped, the scheduler sends a new one
+        if len(frame.lines) != len(self.lyrics_arr):
+            return
+
+        # Moving on to the next line rotates the ring and carries on from wherever the lines are, even mid
+        # transition, so only the new bottom line changes text. Anything else (seeks, new tracks) starts over
+        sequential = self.shown_line == (frame.track_id, frame.index - 1) and self.line_texts[1:] == list(frame.lines[:-1])
+        self.shown_line = (frame.track_id, frame.index)
+        self.ClearWords()
+
+        # Lines outside the timeline (blanks, messages) are keyed by their text
+        keys = [line_id if line_id != -1 else text for text, line_id in zip(frame.lines, frame.line_ids)]
+        self.LayoutLines(frame.lines, keys)
+
+        if sequential:
+            self.RotateLines()
+            changed = [len(self.lyrics_arr) - 1]
+        else:
+            self.ResetLines()
+            changed = range(len(self.lyrics_arr))
+
+        for slot in changed:
+            lyrics = self.Slot(slot)
+            lyrics.setTextFormat(Qt.TextFormat.PlainText)
+            lyrics.setText(frame.lines[slot])
+            lyrics.line_key = keys[slot]
+
+        self.word_line = frame.index
+        self.CheckWordTiming()
+
+        if self.chosen_motion == "scroll":
+            self.SetScrollWindow(frame)
+        self.Animate(self.TransitionDuration(frame.wait_time))
+        self.Prerender(frame.index)
+
+    def SetWordSource(self, source):
+        # Source of word timings and of the clock scrolling follows, anything with a timeline and a clock
+        self.word_source = source
+
+    def CheckWordTiming(self):
+        # Only run the word timer while the current track has word timings
+        timeline = self.word_source.timeline if self.word_source else None
+        self.word_state = None
+        self.word_item = self.Slot(self.current_slot)
+        self.word_line_text = self.word_item.text()
+
+        if timeline is None or not timeline.word_times:
+            self.word_cursor = None
+            self.word_timer.stop()
+            return
+
+        if self.word_cursor is None or self.word_cursor.timeline is not timeline:
+            self.word_cursor = WordCursor(timeline)
+        if not self.word_timer.isActive():
+            self.word_timer.start()
+
+    def ClearWords(self):
+        # Put the highlighted line back to plain text before it moves on
+        if self.word_state is not None:
+            self.word_item.setTextFormat(Qt.TextFormat.PlainText)
+            self.word_item.setText(self.word_line_text)
+        self.word_state = None
+
+    def UpdateWords(self):
+        timeline = self.word_source.timeline
+        if self.word_cursor is None or self.word_cursor.timeline is not timeline:
+            self.CheckWordTiming()
+            return
+
+        line_ind = self.word_line
+        if line_ind < 0 or line_ind >= len(timeline.line_ids) or timeline.texts[timeline.line_ids[line_ind]] != self.word_line_text:
+            return
+
+        sung = self.word_cursor.SungCharacters(line_ind, self.word_source.clock.Position())
+        if sung is None or (line_ind, sung) == self.word_state:
+            return
+        self.word_state = (line_ind, sung)
+
+        # Sung part in the chosen color, the rest faded out
+        text = self.word_line_text
+        color = QColor(self.chosen_color)
+        self.word_item.setTextFormat(Qt.TextFormat.RichText)
+        self.word_item.setText(
+            f"<span>{html.escape(text[:sung])}</span>"
+            f"<span style=\"color: rgba({color.red()}, {color.green()}, {color.blue()}, 45%)\">{html.escape(text[sung:])}</span>"
+        )
 
 
@@ -1,13 +1,41 @@
 import spotipy
 from lrclib import LrcLibAPI
+from spotipy.exceptions import SpotifyException
+import asyncio
+import random
+import threading
 import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from HttpSession import HedgedCaller, ThreadLocalSession
+from LyricCache import LyricCache
+from LyricResolver import LyricResolver
+from LrcParser import ParseLrc
+from PlaybackClock import PlaybackClock
+
+
+# Immutable snapshot of the playback state, the display schedules line changes from it. version only
+# ever grows, timeline is None while lyrics load or if there are none (message says which), the
+# track was at position (seconds) at anchor_time (time.monotonic)
+PlaybackAnchor = namedtuple("PlaybackAnchor", ["version", "track_id", "timeline", "message", "position", "anchor_time", "playing"])
+
+# Fetcher states
+LOGGED_OUT = "logged out"
+IDLE = "idle"
+PAUSED = "paused"
+PLAYING = "playing"
+ERROR = "error"
 
 
 
 class LyricFetcher:
     def __init__(self, callback_function):
 
-        self.lrc_api = LrcLibAPI(user_agent="SpotifyLyrics/1.0")
+        self.lrc_api = LrcLibAPI(user_agent="SpotifyLyrics/1.0", session=ThreadLocalSession())
+        self.lrc_hedge = HedgedCaller()
+        self.resolver = LyricResolver(self.lrc_api, self.lrc_hedge)
+        self.lyric_cache = LyricCache()
         self.callback = callback_function
         self.running = True
 
@@ -17,145 +45,392 @@ class LyricFetcher:
         self.track_name = ""
         self.album_name = ""
         self.duration = 0
-        self.timestamps = []
-        self.lyrics = []
-        self.current_lyrics = []
-        self.display_lyrics = ["", "", "", ""]
-        self.ind = 0
-        self.wait_time = 0
+        self.timeline = None
+        self.message = ""
+        self.anchor_version = 0
+
+        # Local playback clock, Spotify is only polled to re-sync it
+        self.clock = PlaybackClock()
+        self.next_poll = 0
+
+        # Prefetch data for the upcoming tracks in the queue
+        self.prefetch_count = 3
+        self.prefetch_window = 20
+        self.prefetch_started = False
+        self.prefetched = {}
+        self.prefetch_lock = threading.Lock()
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="LyricPrefetch")
+
+        # Lyric lookups run on workers, at most one in flight per track
+        self.fetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="LyricFetch")
+        self.fetch_lock = threading.Lock()
+        self.in_flight = {}
+        self.ready_lyrics = None
+        self.fast_fetch_time = 0.05
+
+        # Cached lyrics older than this are re-checked against lrclib in the background
+        self.revalidate_age = 3 * 24 * 3600
+        self.revalidate_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="LyricRevalidate")
+        self.revalidating = set()
+
+        # Set to cut a sleep short, e.g. when lyrics arrive
+        self.wake = threading.Event()
+        self.wake_async = None
+
+        # State machine and back-off settings
+        self.state = LOGGED_OUT
+        self.quiet_polls = 0
+        self.paused_max_interval = 8
+        self.idle_max_interval = 15
+        self.error_count = 0
+        self.error_base_interval = 1
+        self.error_max_interval = 60
 
         self.sp = None
+        self.client_ready = threading.Event()
+        self.client_ready_async = None
+
+    def SetClient(self, sp):
+        # Wakes the fetcher up if it was waiting for a login
+        self.sp = sp
+        self.client_ready.set()
+        if self.client_ready_async:
+            self.client_ready_async[0].call_soon_threadsafe(self.client_ready_async[1].set)
+
+    def Wake(self):
+        self.wake.set()
+        if self.wake_async:
+            self.wake_async[0].call_soon_threadsafe(self.wake_async[1].set)
+
+    def SetState(self, state):
+        if state != self.state:
+            print(f"[LyricFetcher] {self.state} -> {state}")
+            self.state = state
+
+    def LoadTimeline(self, timeline, message=""):
+        # timeline is None while lyrics load or if there are none, message tells the display which
+        self.timeline = timeline
+        self.message = message
+
+    def EmitAnchor(self):
+        # Hand the current timeline and clock state to the callback
+        if not self.callback:
+            return
 
-    def ExtractTimestamps(self, temp_lyrics):
-        self.ind = 0
-        self.timestamps.clear()
-        self.lyrics.clear()
-        self.display_lyrics = ["", "", "", ""]
+        position, anchor_time, playing = self.clock.Snapshot()
+        self.anchor_version += 1
+        self.callback(PlaybackAnchor(self.anchor_version, self.last_id, self.timeline, self.message, position, anchor_time, playing))
+
+    def FetchLyrics(self, track_id, track_name, artist_name, album_name, duration):
+        # Serve from the local cache when we can, only hit lrclib on a miss
+        cached = self.lyric_cache.Get(track_id, track_name, artist_name, album_name, duration)
+        if cached:
+            synced_lyrics, fetched_at = cached
+            if time.time() - fetched_at > self.revalidate_age:
+                self.Revalidate(track_id, track_name, artist_name, album_name, duration, synced_lyrics)
+            return synced_lyrics
+
+        # Tracks known to have no synced lyrics cost no network calls
+        miss = self.lyric_cache.GetMiss(track_id, track_name, artist_name, album_name, duration)
+        if miss:
+            print(f"Skipping lookup, cached {miss} for this track")
+            return None
+
+        # A lookup that failed (even if the others found nothing) is retried soon, only a clean
+        # not found from every lookup is remembered as a miss
+        try:
+            synced_lyrics = self.resolver.Resolve(track_name, artist_name, album_name, duration)
+        except Exception:
+            self.lyric_cache.PutMiss(track_id, track_name, artist_name, album_name, duration, kind="error")
+            raise
+
+        if not synced_lyrics:
+            self.lyric_cache.PutMiss(track_id, track_name, artist_name, album_name, duration, kind="miss")
+            return None
+
+        self.lyric_cache.Put(track_id, track_name, artist_name, album_name, duration, synced_lyrics)
+        return synced_lyrics
+
+    def Revalidate(self, track_id, track_name, artist_name, album_name, duration, synced_lyrics):
+        # Serve the stale lyrics now, refresh them on a single background worker
+        with self.fetch_lock:
+            if track_id in self.revalidating:
+                return
+            self.revalidating.add(track_id)
+
+        self.revalidate_pool.submit(self.RevalidateTrack, track_id, track_name, artist_name, album_name, duration, synced_lyrics)
+
+    def RevalidateTrack(self, track_id, track_name, artist_name, album_name, duration, synced_lyrics):
+        # Keep what we have if lrclib has nothing now, but check again only after another revalidate_age
+        # (or the error back-off if the lookup failed) instead of on every play
+        try:
+            new_lyrics = self.resolver.Resolve(track_name, artist_name, album_name, duration)
+            retry_after = self.revalidate_age
+        except Exception as e:
+            print(f"Error revalidating lyrics: {e}")
+            new_lyrics = None
+            retry_after = self.lyric_cache.ttls["error"]
+        finally:
+            with self.fetch_lock:
+                self.revalidating.discard(track_id)
+
+        if not new_lyrics:
+            self.lyric_cache.Refresh(track_id, track_name, artist_name, album_name, duration, time.time() - self.revalidate_age + retry_after)
+            return
 
-        if temp_lyrics is None:
-            self.ind = -1
+        # Otherwise store it, refreshing its age
+        self.lyric_cache.Put(track_id, track_name, artist_name, album_name, duration, new_lyrics)
+
+        # Swap the new timeline in if it changed and the track is still playing
+        if new_lyrics != synced_lyrics and track_id == self.last_id:
+            print(f"Lyrics for {track_name} changed on lrclib, updating")
+            timeline = ParseLrc(new_lyrics)
+            future = Future()
+            future.set_result(timeline if timeline.timestamps else None)
+            self.LyricsReady(track_id, future)
+
+    def ResolveTimeline(self, track_id, track_name, artist_name, album_name, duration):
+        synced_lyrics = self.FetchLyrics(track_id, track_name, artist_name, album_name, duration)
+        timeline = ParseLrc(synced_lyrics) if synced_lyrics else None
+
+        if timeline is not None and not timeline.timestamps:
+            return None
+        return timeline
+
+    def RequestLyrics(self, track_id, track_name, artist_name, album_name, duration, pool):
+        # Returns a future for the track's timeline, sharing any lookup already in flight
+        with self.fetch_lock:
+            future = self.in_flight.get(track_id)
+            if future is None:
+                future = pool.submit(self.ResolveTimeline, track_id, track_name, artist_name, album_name, duration)
+                self.in_flight[track_id] = future
+                future.add_done_callback(lambda done: self.FinishRequest(track_id, done))
+        return future
+
+    def FinishRequest(self, track_id, future):
+        with self.fetch_lock:
+            if self.in_flight.get(track_id) is future:
+                del self.in_flight[track_id]
+
+    def LyricsReady(self, track_id, future):
+        # Runs on the worker, the lyrics are applied by the polling loop
+        with self.fetch_lock:
+            self.ready_lyrics = (track_id, future)
+        self.Wake()
+
+    def ApplyLyrics(self, future):
+        try:
+            timeline = future.result()
+        except Exception as e:
+            print(f"Error fetching lyrics: {e}")
+            timeline = None
+
+        if timeline is None:
+            print("No synced lyrics found")
+            self.LoadTimeline(None, "No lyrics for this track :(")
+        else:
+            self.LoadTimeline(timeline)
+
+    def PrefetchQueue(self):
+        # Read the next few tracks from the playback queue and fetch their lyrics ahead of time
+        try:
+            upcoming = self.sp.queue().get("queue", [])
+        except Exception as e:
+            print(f"Error reading playback queue: {e}")
             return
 
-        for raw in temp_lyrics:
-            if ']' not in raw or '[' not in raw:
+        upcoming_ids = []
+        for item in upcoming:
+            if len(upcoming_ids) >= self.prefetch_count:
+                break
+            if not item or item.get("type") != "track" or not item.get("id"):
                 continue
+            upcoming_ids.append(item["id"])
+
+            with self.prefetch_lock:
+                if item["id"] in self.prefetched:
+                    continue
+
+            future = self.RequestLyrics(
+                item["id"],
+                item["name"],
+                item["artists"][0]["name"],
+                item["album"]["name"],
+                item["duration_ms"] // 1000,
+                self.prefetch_pool
+            )
+
+            with self.prefetch_lock:
+                self.prefetched[item["id"]] = future
+
+        # Forget tracks that left the queue
+        with self.prefetch_lock:
+            for track_id in list(self.prefetched):
+                if track_id not in upcoming_ids:
+                    del self.prefetched[track_id]
+
+    def TakePrefetched(self, track_id):
+        with self.prefetch_lock:
+            return self.prefetched.pop(track_id, None)
+
+    def Poll(self):
+        # Get the current track
+        request_start = time.monotonic()
+        current_track = self.sp.current_user_playing_track()
+        request_end = time.monotonic()
+
+        self.error_count = 0
+
+        # If nothing is playing or playback is paused, freeze the clock and back off
+        if not current_track or not current_track["item"] or not current_track["is_playing"]:
+            if not current_track or not current_track["item"]:
+                self.SetState(IDLE)
+                self.clock.Pause()
+                max_interval = self.idle_max_interval
+            else:
+                self.SetState(PAUSED)
+                self.clock.Pause(current_track["progress_ms"] / 1000 if current_track["progress_ms"] is not None else None)
+                max_interval = self.paused_max_interval
+
+            interval = min(self.clock.min_interval * 2 ** self.quiet_polls, max_interval)
+            self.next_poll = request_end + interval
+
+            # Stop doubling at the cap, 2 ** quiet_polls would overflow a float after long enough
+            if interval < max_interval:
+                self.quiet_polls += 1
+            self.EmitAnchor()
+            return
+
+        self.SetState(PLAYING)
+        self.quiet_polls = 0
+
+        # Get the current id
+        track_id = current_track["item"]["id"]
+        track_changed = track_id != self.last_id
+
+        # Check if the track changed to update data
+        if track_changed:
+            self.artist_name = current_track["item"]["artists"][0]["name"]
+            self.track_name = current_track["item"]["name"]
+            self.album_name = current_track["item"]["album"]["name"]
+            # Fractional seconds for the poll schedule, lyric lookups match on whole seconds
+            self.duration = current_track["item"]["duration_ms"] / 1000
+            self.last_id = track_id
+            self.prefetch_started = False
+
+            print(f"Playing {self.track_name} by {self.artist_name}")
+
+            future = self.TakePrefetched(track_id)
+            if future is None:
+                future = self.RequestLyrics(track_id, self.track_name, self.artist_name, self.album_name, int(self.duration), self.fetch_pool)
+
+            # Cached and prefetched lyrics are there right away, otherwise keep polling while they load
+            wait([future], timeout=self.fast_fetch_time)
+            if future.done():
+                self.ApplyLyrics(future)
+            else:
+                self.LoadTimeline(None)
+                future.add_done_callback(lambda done: self.LyricsReady(track_id, done))
+
+        # Re-sync the local clock, the progress was sampled while the request was in flight
+        self.clock.Sync(current_track["progress_ms"] / 1000, request_start, request_end, reset=track_changed)
+        self.next_poll = request_end + self.clock.NextPollDelay(self.duration)
+        self.EmitAnchor()
+
+    def Advance(self):
+        # Hand over lyrics that finished loading, returns how long we can sleep. Line changes
+        # are timed by the display, so only polls and finished lookups wake us up
+        with self.fetch_lock:
+            ready_lyrics = self.ready_lyrics
+            self.ready_lyrics = None
+
+        # Lyrics that finished loading in the background, ignored if the track changed since
+        if ready_lyrics and ready_lyrics[0] == self.last_id:
+            self.ApplyLyrics(ready_lyrics[1])
+            self.EmitAnchor()
+
+        # Start fetching lyrics for the upcoming tracks near the end of this one
+        if self.clock.playing and not self.prefetch_started and self.duration - self.clock.Position() <= self.prefetch_window:
+            self.prefetch_started = True
+            self.prefetch_pool.submit(self.PrefetchQueue)
+
+        return max(self.next_poll - time.monotonic(), 0.01)
+
+    def ErrorDelay(self, error):
+        # Exponential back-off with jitter, Spotify's Retry-After wins on rate limits
+        self.error_count += 1
+        delay = min(self.error_base_interval * 2 ** (self.error_count - 1), self.error_max_interval)
+        delay = random.uniform(delay / 2, delay)
+
+        if isinstance(error, SpotifyException) and error.http_status == 429:
             try:
-                raw_time, raw_lyrics = raw[1:].split("]", 1)
-                minutes, seconds = raw_time.split(":")
-                minutes = int(minutes)
-                seconds = float(seconds)
-                total_time = minutes * 60 + seconds
-
-                if raw_lyrics.strip() == "":
-                    raw_lyrics = "(...)"
-
-                self.timestamps.append(total_time)
-                self.lyrics.append(raw_lyrics[1:] if raw_lyrics.startswith(' ') else raw_lyrics)
-            except (ValueError, IndexError):
-                continue
+                delay = max(delay, float(error.headers.get("Retry-After", 0)))
+            except (TypeError, ValueError):
+                pass
 
-        for i in range(3):
-            self.timestamps.append(self.timestamps[-1] + 5)
-            self.lyrics.append("")
+        return delay
 
-    def FindLocation(self, progress):
-        # Find where we are in the song
-        if self.ind == -1:
-            return False
+    def Run(self):
 
-        old_ind = self.ind
-        track_length = len(self.timestamps)
+        while self.running:
+            if not self.sp:
+                self.SetState(LOGGED_OUT)
+                self.client_ready.wait()
+                continue
 
-        while self.ind < track_length - 1 and progress > self.timestamps[self.ind+1]-0.1:
-            self.ind += 1
+            try:
+                if time.monotonic() >= self.next_poll:
+                    self.Poll()
 
-        while self.ind > 0 and progress < self.timestamps[self.ind-1]-0.1:
-            self.ind -= 1
+                self.wake.wait(self.Advance())
+                self.wake.clear()
 
-        if self.ind < track_length - 1:
-            self.wait_time = self.timestamps[self.ind] - progress - 0.1
-        else:
-            self.wait_time = 0
-
-        # The lyrics changed
-        if old_ind != self.ind:
-            self.PrepareLyrics(self.ind)
-            return True
-        return False
-
-    def PrepareLyrics(self, ind):
-        # Update lyrics to new ones
-        self.display_lyrics = ["", "", "", ""]
-
-        if ind >= 2:
-            self.display_lyrics[0] = self.lyrics[ind - 2]
-        if ind >= 1:
-            self.display_lyrics[1] = self.lyrics[ind - 1]
-        if ind < len(self.lyrics):
-            self.display_lyrics[2] = self.lyrics[ind]
-        if ind < len(self.lyrics) - 1:
-            self.display_lyrics[3] = self.lyrics[ind + 1]
+            except Exception as e:
+                self.SetState(ERROR)
+                delay = self.ErrorDelay(e)
+                print(f"Error in lyric fetcher: {e}, retrying in {delay:.1f}s")
+                self.next_poll = time.monotonic() + delay
+                time.sleep(delay)
 
-    def Run(self):
+    async def RunAsync(self):
+        # Same loop as Run, but cooperative: blocking Spotify/lrclib calls go to the loop's executor
+        loop = asyncio.get_running_loop()
+        self.client_ready_async = (loop, asyncio.Event())
+        self.wake_async = (loop, asyncio.Event())
 
         while self.running:
-            if(self.sp):
+            if not self.sp:
+                self.SetState(LOGGED_OUT)
+                await self.client_ready_async[1].wait()
+                continue
+
+            try:
+                if time.monotonic() >= self.next_poll:
+                    await loop.run_in_executor(None, self.Poll)
+
                 try:
-                    # Get the current track
-                    current_track = self.sp.current_user_playing_track()
-
-                    # If the track is available and still playing
-                    if current_track and current_track["is_playing"]:
-                        # Get the current id
-                        track_id = current_track["item"]["id"]
-
-                        # Check if the track changed to update data
-                        if track_id != self.last_id:
-                            self.artist_name = current_track["item"]["artists"][0]["name"]
-                            self.track_name = current_track["item"]["name"]
-                            self.album_name = current_track["item"]["album"]["name"]
-                            self.duration = current_track["item"]["duration_ms"] // 1000
-                            self.last_id = track_id
-
-                            print(f"Playing {self.track_name} by {self.artist_name}")
-
-                            try:
-                                lyric_result = self.lrc_api.get_lyrics(
-                                    track_name=self.track_name,
-                                    artist_name=self.artist_name,
-                                    album_name=self.album_name,
-                                    duration=self.duration
-                                )
-                                if lyric_result and lyric_result.synced_lyrics:
-                                    self.current_lyrics = lyric_result.synced_lyrics
-                                    self.ExtractTimestamps(self.current_lyrics.splitlines())
-                                else:
-                                    self.ind = -1
-                                    print("No synced lyrics found")
-                                    self.display_lyrics = ["", "", "No lyrics for this track :(", ""]
-                                    self.callback(self.display_lyrics)
-
-                            # If no lyrics found
-                            except Exception as e:
-                                print(f"Error fetching lyrics: {e}")
-                                self.ind = -1
-                                self.display_lyrics = ["", "", "No lyrics for this track :(", ""]
-                                self.callback(self.display_lyrics)
-
-                        # Get the current progress in seconds
-                        progress = current_track["progress_ms"] / 1000
-                        lyrics_changed = self.FindLocation(progress)
-
-                        # If lyrics changed, notify the callback
-                        if lyrics_changed and self.callback:
-                            self.callback(self.display_lyrics)
-
-                        time.sleep(0.5)
-
-                except Exception as e:
-                    print(f"Error in lyric fetcher: {e}")
+                    await asyncio.wait_for(self.wake_async[1].wait(), self.Advance())
+                except asyncio.TimeoutError:
+                    pass
+                self.wake_async[1].clear()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.SetState(ERROR)
+                delay = self.ErrorDelay(e)
+                print(f"Error in lyric fetcher: {e}, retrying in {delay:.1f}s")
+                self.next_poll = time.monotonic() + delay
+                await asyncio.sleep(delay)
 
     def Stop(self):
         self.running = False
+        self.client_ready.set()
+        self.Wake()
+        self.prefetch_pool.shutdown(wait=False)
+        self.fetch_pool.shutdown(wait=False)
+        self.revalidate_pool.shutdown(wait=False)
+        self.lrc_hedge.Shutdown()
+        self.resolver.Shutdown()
 
 
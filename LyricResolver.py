@@ -0,0 +1,88 @@
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from lrclib.exceptions import NotFoundError
+
+
+
+# Suffixes Spotify adds that lrclib entries usually do not have
+DASH_SUFFIX = re.compile(r"\s+-\s+[^-]*\b(remaster(ed)?|live|version|edit|mix|mono|stereo|deluxe|bonus|acoustic|demo|single)\b.*$", re.IGNORECASE)
+BRACKET_SUFFIX = re.compile(r"\s*[\(\[][^\)\]]*\b(feat\.?|ft\.?|with|remaster(ed)?|live|version|edit|mix|mono|stereo|deluxe|bonus)\b[^\)\]]*[\)\]]", re.IGNORECASE)
+
+
+def NormalizeTitle(title):
+    title = DASH_SUFFIX.sub("", title)
+    title = BRACKET_SUFFIX.sub("", title)
+    return title.strip() or title
+
+
+
+class LyricResolver:
+    def __init__(self, lrc_api, hedge=None, max_workers=4, duration_tolerance=5):
+
+        self.lrc_api = lrc_api
+        self.hedge = hedge
+        self.duration_tolerance = duration_tolerance
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="LyricResolver")
+
+    def Exact(self, track_name, artist_name, album_name, duration):
+        try:
+            if self.hedge:
+                result = self.hedge.Call(self.lrc_api.get_lyrics, track_name=track_name, artist_name=artist_name, album_name=album_name, duration=duration)
+            else:
+                result = self.lrc_api.get_lyrics(track_name=track_name, artist_name=artist_name, album_name=album_name, duration=duration)
+        except NotFoundError:
+            return []
+        return [result] if result else []
+
+    def Search(self, track_name, artist_name):
+        return list(self.lrc_api.search_lyrics(track_name=track_name, artist_name=artist_name))
+
+    def Best(self, results, duration):
+        # Closest synced match within the duration tolerance
+        best = None
+        best_diff = None
+
+        for result in results:
+            if not result.synced_lyrics or result.duration is None:
+                continue
+            diff = abs(result.duration - duration)
+            if diff <= self.duration_tolerance and (best_diff is None or diff < best_diff):
+                best = result
+                best_diff = diff
+
+        return best
+
+    def Resolve(self, track_name, artist_name, album_name, duration):
+        # Exact lookup and title searches race each other, the first good match wins
+        futures = [self.pool.submit(self.Exact, track_name, artist_name, album_name, duration)]
+        futures.append(self.pool.submit(self.Search, track_name, artist_name))
+
+        normalized = NormalizeTitle(track_name)
+        if normalized != track_name:
+            futures.append(self.pool.submit(self.Search, normalized, artist_name))
+
+        error = None
+        try:
+            for future in as_completed(futures):
+                try:
+                    best = self.Best(future.result(), duration)
+                except Exception as e:
+                    error = error or e
+                    continue
+
+                if best:
+                    return best.synced_lyrics
+
+        # Lookups that already started finish in the background and are ignored
+        finally:
+            for future in futures:
+                future.cancel()
+
+        # Nothing found is only a miss if every lookup got an answer, a failed one means we don't know
+        if error:
+            raise error
+        return None
+
+    def Shutdown(self):
+        self.pool.shutdown(wait=False)
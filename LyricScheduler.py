@@ -0,0 +1,170 @@
+import math
+from bisect import bisect_left
+from collections import namedtuple
+
+from PyQt6.QtCore import Qt, QObject, QTimer, pyqtSignal
+
+from LrcParser import EMPTY_TIMELINE
+from PlaybackClock import PlaybackClock
+
+
+# Immutable snapshot of what the display should show. version only ever grows, lines holds the
+# line fading out followed by the visible window around the current line, line_ids their timeline text ids (-1 for blanks and
+# messages), clock is the playback position when it was made and wait_time how long until the
+# next line (0 if unknown)
+LyricFrame = namedtuple("LyricFrame", ["version", "index", "lines", "line_ids", "track_id", "clock", "wait_time"])
+
+
+
+# Lives on the GUI thread. Gets the timeline once per track and clock anchors from the fetcher,
+# and times every line change itself
+class LyricScheduler(QObject):
+    lyrics_changed = pyqtSignal(object)
+    timeline_changed = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        # Local copy of the fetcher's clock, re-anchored on every poll
+        self.clock = PlaybackClock()
+
+        # Current track data
+        self.track_id = None
+        self.source_timeline = None
+        self.message = ""
+        self.timeline = EMPTY_TIMELINE
+        self.timestamps = EMPTY_TIMELINE.timestamps
+        self.line_ids = EMPTY_TIMELINE.line_ids
+        self.texts = EMPTY_TIMELINE.texts
+        self.display_lyrics = ("", "", "", "")
+        self.display_ids = (-1, -1, -1, -1)
+        self.frame_version = 0
+
+        # Visible lines before and after the current one, see SetWindow
+        self.window_before = 1
+        self.window_after = 1
+        self.ind = -1
+        self.wait_time = 0
+        self.lead_time = 0.1
+        self.outro_lines = 3
+        self.outro_step = 5
+        self.frame_pending = False
+
+        # Fires when the next line is due
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.Tick)
+
+    def Apply(self, anchor):
+        # Only a new track or timeline resets the display, every anchor re-syncs the clock
+        if anchor.track_id != self.track_id or anchor.timeline is not self.source_timeline or anchor.message != self.message:
+            self.track_id = anchor.track_id
+            self.source_timeline = anchor.timeline
+            self.message = anchor.message
+            self.LoadTimeline(anchor.timeline)
+
+        self.clock.SetAnchor(anchor.position, anchor.anchor_time, anchor.playing)
+        self.Tick()
+
+    def LoadTimeline(self, timeline):
+        self.ind = 0
+        self.wait_time = 0
+
+        if timeline is None:
+            self.ind = -1
+            timeline = EMPTY_TIMELINE
+
+        self.timeline = timeline
+        self.timestamps = timeline.timestamps
+        self.line_ids = timeline.line_ids
+        self.texts = timeline.texts
+        self.timeline_changed.emit(None if self.ind == -1 else timeline)
+
+        # Show the right line straight away, even if it is the first one
+        self.frame_pending = self.ind != -1
+
+        if self.ind == -1:
+            self.PrepareMessage()
+            self.EmitFrame()
+
+    def SetWindow(self, before, after):
+        # Match the display's number of lines, it gets a fresh frame right away
+        if (before, after) == (self.window_before, self.window_after):
+            return
+        self.window_before = before
+        self.window_after = after
+
+        if self.ind == -1:
+            self.PrepareMessage()
+            self.EmitFrame()
+        else:
+            self.frame_pending = True
+            self.Tick()
+
+    def PrepareMessage(self):
+        # Without lyrics the current line holds the fetcher's message
+        line_count = self.window_before + self.window_after + 2
+        self.display_ids = (-1,) * line_count
+        self.display_lyrics = tuple(self.message if slot == self.window_before + 1 else "" for slot in range(line_count))
+
+    def FindLocation(self, progress):
+        # Find where we are in the song
+        if self.ind == -1:
+            return False
+
+        old_ind = self.ind
+        track_length = len(self.timestamps)
+
+        # Last line starting before progress (lines are shown lead_time early)
+        self.ind = max(bisect_left(self.timestamps, progress + self.lead_time) - 1, 0)
+
+        if self.ind < track_length - 1:
+            self.wait_time = self.timestamps[self.ind+1] - progress - self.lead_time
+
+        # Past the last line, scroll it out of view step by step
+        elif track_length:
+            outro_time = progress + self.lead_time - self.timestamps[-1]
+            outro_ind = min(int(outro_time // self.outro_step), self.outro_lines) if outro_time > 0 else 0
+            self.ind += outro_ind
+
+            if outro_ind < self.outro_lines:
+                self.wait_time = (outro_ind + 1) * self.outro_step - outro_time
+            else:
+                self.wait_time = 0
+
+        else:
+            self.wait_time = 0
+
+        # The lyrics changed
+        if old_ind != self.ind or self.frame_pending:
+            self.frame_pending = False
+            self.PrepareLyrics(self.ind)
+            return True
+        return False
+
+    def PrepareLyrics(self, ind):
+        # Update lyrics to new ones, from the line fading out to the last visible one
+        line_count = len(self.line_ids)
+        self.display_ids = tuple(
+            self.line_ids[line] if 0 <= line < line_count else -1
+            for line in range(ind - self.window_before - 1, ind + self.window_after + 1)
+        )
+        self.display_lyrics = tuple(self.texts[line_id] if line_id != -1 else "" for line_id in self.display_ids)
+
+    def EmitFrame(self):
+        self.frame_version += 1
+        self.lyrics_changed.emit(LyricFrame(self.frame_version, self.ind, self.display_lyrics, self.display_ids, self.track_id, self.clock.Position(), max(self.wait_time, 0)))
+
+    def Tick(self):
+        self.timer.stop()
+
+        if self.FindLocation(self.clock.Position()):
+            self.EmitFrame()
+
+        # Sleep until the next line is due, the clock only moves while playing
+        if self.ind != -1 and self.clock.playing and self.wait_time > 0:
+            self.timer.start(math.ceil(self.wait_time * 1000))
+
+    def Stop(self):
+        self.timer.stop()
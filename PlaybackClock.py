@@ -0,0 +1,88 @@
+import threading
+import time
+
+
+
+class PlaybackClock:
+    def __init__(self):
+
+        self.lock = threading.Lock()
+
+        # Position (in seconds) at the monotonic anchor time
+        self.position = 0.0
+        self.anchor = time.monotonic()
+        self.playing = False
+
+        # Smoothed request round-trip time and last measured drift
+        self.rtt = 0.0
+        self.drift = 0.0
+
+        # Polling schedule
+        self.min_interval = 1.0
+        self.max_interval = 3.0
+        self.end_interval = 0.25
+        self.drift_tolerance = 0.05
+        self.seek_threshold = 1.0
+        self.fast_polls = 0
+
+    def Position(self):
+        with self.lock:
+            if self.playing:
+                return self.position + time.monotonic() - self.anchor
+            return self.position
+
+    def Sync(self, progress, request_start, request_end, reset=False):
+        # Spotify sampled the position somewhere during the request, assume the midpoint
+        rtt = request_end - request_start
+        self.rtt = rtt if self.rtt == 0 else self.rtt * 0.8 + rtt * 0.2
+        observed = progress + rtt / 2
+
+        with self.lock:
+            if self.playing and not reset:
+                self.drift = observed - (self.position + request_end - self.anchor)
+            else:
+                self.drift = 0.0
+
+            # Poll faster for a while after a seek, a new track or noticeable drift
+            if reset or abs(self.drift) > self.seek_threshold:
+                self.fast_polls = 3
+            elif abs(self.drift) > self.drift_tolerance:
+                self.fast_polls = max(self.fast_polls, 1)
+            elif self.fast_polls > 0:
+                self.fast_polls -= 1
+
+            self.position = observed
+            self.anchor = request_end
+            self.playing = True
+
+        return self.drift
+
+    def Pause(self, progress=None):
+        with self.lock:
+            if progress is not None:
+                self.position = progress
+            elif self.playing:
+                self.position += time.monotonic() - self.anchor
+            self.anchor = time.monotonic()
+            self.playing = False
+
+    def Snapshot(self):
+        # (position, anchor, playing), enough for another clock to extrapolate the same way
+        with self.lock:
+            return self.position, self.anchor, self.playing
+
+    def SetAnchor(self, position, anchor, playing):
+        with self.lock:
+            self.position = position
+            self.anchor = anchor
+            self.playing = playing
+
+    def NextPollDelay(self, duration):
+        interval = self.min_interval if self.fast_polls > 0 else self.max_interval
+
+        # Check back right as the track should end so the next one is picked up quickly
+        remaining = max(duration - self.Position(), 0)
+        if remaining < interval:
+            interval = max(remaining, self.end_interval)
+
+        return interval
@@ -1,15 +1,18 @@
+import asyncio
 import threading
 import time
 import urllib.parse
 import webbrowser
 from datetime import datetime
 
-import requests
 import spotipy
+from urllib3.util.retry import Retry
 from flask import Flask, redirect, request, jsonify, json
 
 import os
 
+from HttpSession import ThreadLocalSession
+
 import base64
 import hashlib
 import secrets
@@ -23,11 +26,12 @@ def generate_code_challenge(verifier):
 
 
 class TokenManager():
-    def __init__(self, client_id="", on_token_refresh=None):
+    def __init__(self, client_id="", on_token_refresh=None, auto_refresh=True):
 
         self.scope = "user-read-currently-playing user-read-playback-state"
 
         self.on_token_refresh = on_token_refresh
+        self.callback_loop = None
 
         self.CLIENT_ID = client_id
         self.CODE_VERIFIER = generate_code_verifier()
@@ -41,6 +45,19 @@ class TokenManager():
 
         self.session = {}
 
+        # Pooled keep-alive connections shared by token requests and the Spotify client, one pool per
+        # thread. spotipy skips building its own session when given this one, so mount the same
+        # retries it would have (429 and 5xx with backoff)
+        self.http = ThreadLocalSession(retries=Retry(
+            total=3,
+            connect=None,
+            read=False,
+            allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
+            status=3,
+            backoff_factor=0.3,
+            status_forcelist=spotipy.Spotify.default_retry_codes
+        ))
+
         self.CACHE_FILE = ".cache"
         self.session = self.load_session()
 
@@ -53,7 +70,8 @@ class TokenManager():
         else:
             print("No valid session found. Login required.")
 
-        self.start_auto_refresh()
+        if auto_refresh:
+            self.start_auto_refresh()
 
         self.app = Flask(__name__)
         self.setup_routes()
@@ -86,7 +104,7 @@ class TokenManager():
                     "code_verifier": self.CODE_VERIFIER
                 }
 
-                response = requests.post(self.TOKEN_URL, data=req_body)
+                response = self.http.post(self.TOKEN_URL, data=req_body)
                 token_info = response.json()
 
                 if "access_token" in token_info:
@@ -177,7 +195,7 @@ class TokenManager():
             "client_id": self.CLIENT_ID
         }
 
-        response = requests.post(self.TOKEN_URL, data=req_body)
+        response = self.http.post(self.TOKEN_URL, data=req_body)
         new_token_info = response.json()
 
         if "access_token" in new_token_info:
@@ -190,20 +208,27 @@ class TokenManager():
             self.save_session()
 
             if self.on_token_refresh:
-                threading.Timer(0.1, self.on_token_refresh).start()
+                if self.callback_loop:
+                    self.callback_loop.call_soon_threadsafe(self.on_token_refresh)
+                else:
+                    threading.Timer(0.1, self.on_token_refresh).start()
 
         else:
             raise Exception("No valid token available")
 
+    def time_until_refresh(self):
+        if not self.session or "expires_at" not in self.session:
+            return None
+
+        time_left = self.session["expires_at"] - datetime.now().timestamp()
+        return time_left if time_left <= 600 else None
+
     def start_auto_refresh(self):
         def refresh_loop():
             while True:
                 time.sleep(300)
-                if not self.session or "expires_at" not in self.session:
-                    continue
-
-                time_left = self.session["expires_at"] - datetime.now().timestamp()
-                if time_left <= 600:
+                time_left = self.time_until_refresh()
+                if time_left is not None:
                     print(f"[TokenManager] Access token expiring in {int(time_left)}s, refreshing...")
                     self.refresh_token()
 
@@ -212,13 +237,28 @@ class TokenManager():
         t = threading.Thread(target=refresh_loop, daemon=True)
         t.start()
 
+    async def auto_refresh_async(self):
+        # Coroutine version of start_auto_refresh for the asyncio runtime
+        loop = asyncio.get_running_loop()
+        self.callback_loop = loop
+
+        while True:
+            await asyncio.sleep(300)
+            time_left = self.time_until_refresh()
+            if time_left is not None:
+                print(f"[TokenManager] Access token expiring in {int(time_left)}s, refreshing...")
+                try:
+                    await loop.run_in_executor(None, self.refresh_token)
+                except Exception as e:
+                    print(f"[TokenManager] Failed refreshing token: {e}")
+
 
     def create_spotify_client(self):
         token = self.get_token()
         if not token:
             raise Exception("No valid token available")
 
-        return spotipy.Spotify(auth=token, requests_timeout=10)
+        return spotipy.Spotify(auth=token, requests_session=self.http, requests_timeout=10)
 
 
 